@@ -25,6 +25,9 @@ sys.path.append(os.path.join(BASE_DIR, APP_DIR))
 
 APPS_ROOT = BASE_DIR / APP_DIR
 
+# Backups of the bot data, restored with the restore_backup command.
+BACKUP_DIR = BASE_DIR / 'backup'
+
 PROJECT_NAME = "Nublado Project"
 
 # SECURITY WARNING: keep the secret key used in production secret!
@@ -122,6 +125,16 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache shared by the web workers, so a cached leaderboard invalidated by one
+# worker isn't served stale by the others. The table is created by the
+# release phase.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -190,6 +203,41 @@ WEEKDAYS_ABBR = [
     _("Fri."), _("Sat."), _("Sun.")
 ]
 
+# Group points
+GROUP_POINTS = {
+    # Buffer point transfers in memory, journaled to `journal_dir`, and write
+    # them to the database every `flush_interval` seconds or `flush_size`
+    # transfers. Members' totals are read from the database at most every
+    # `totals_ttl` seconds.
+    'write_behind': {
+        'enabled': False,
+        'journal_dir': '/tmp/nublado-points',
+        'flush_interval': 10,
+        'flush_size': 50,
+        'totals_ttl': 60
+    },
+    # Point replies are limited per sender and per sender and receiver within
+    # sliding windows (in seconds). `groups` overrides the limits by group id.
+    'throttle': {
+        'enabled': True,
+        'maxsize': 10000,
+        'default': {
+            'sender_limit': 10,
+            'sender_window': 60,
+            'pair_limit': 3,
+            'pair_window': 60
+        },
+        'groups': {}
+    },
+    # Point changes announced in a chat within `window` seconds of each other
+    # are added to the same message, up to `max_lines`.
+    'announcements': {
+        'enabled': True,
+        'window': 60,
+        'max_lines': 10
+    }
+}
+
 # Telegram bot stuff
 BOT_MODE_WEBHOOK = "webhook"
 BOT_MODE_POLLING = "polling"
@@ -209,6 +257,78 @@ DJANGO_TELEGRAM = {
     'webhook_port': int(os.environ.get('PORT', 5000)),
     'webhook_site' : "https://nubladoproject.herokuapp.com",
 	'webhook_path' : "bot/webhook",
+    # Webhook updates are acknowledged right away and dispatched by this many
+    # background threads (lanes). Updates from the same chat always share a lane
+    # and are processed in order. 0 processes updates inside the webhook request.
+    'webhook_workers': 0,
+    'webhook_queue_size': 100,
+    # Seconds to wait for queued updates to be processed on shutdown.
+    'webhook_drain_timeout': 10,
+    # Return the first message sent by a command as the webhook response instead
+    # of making a separate request. Only applies to commands marked with
+    # reply_in_response. With webhook workers, the webhook request waits up to
+    # `webhook_reply_timeout` seconds for the update's lane to make the reply,
+    # and the reply is sent as a separate request if it takes longer.
+    'webhook_reply': True,
+    'webhook_reply_timeout': 0.5,
+    # Drop updates redelivered by Telegram within a window of the last received
+    # update ids. The database backend is shared across processes and restarts.
+    'update_dedup': {
+        'backend': 'memory',
+        'size': 1000
+    },
+    # Member statuses checked by the permission decorators are cached for
+    # `ttl` seconds and kept in sync with membership updates.
+    'member_status_cache': {
+        'maxsize': 1000,
+        'ttl': 300
+    },
+    # Random members are sampled from arrays of member ids cached per group,
+    # reloaded every `ttl` seconds.
+    'member_sampler': {
+        'ttl': 600
+    },
+    # Outbound requests are throttled with token buckets (per second rates)
+    # and retried after flood errors. The file and database backends share
+    # the buckets between processes. With the database backend, each process
+    # leases `lease_size` global tokens at a time.
+    'rate_limit': {
+        'backend': 'local',
+        'file_path': '/tmp/nublado-rate-limit.json',
+        'lease_size': 5,
+        'global_rate': 30,
+        'global_burst': 30,
+        'private_chat_rate': 1,
+        'private_chat_burst': 3,
+        'group_chat_rate': 20 / 60,
+        'group_chat_burst': 20,
+        'max_retries': 3
+    },
+    # Chat actions (e.g., "typing...") are sent in the background, at most once
+    # per chat every `interval` seconds, and only for commands still running
+    # after `latency_budget` seconds.
+    'chat_actions': {
+        'enabled': True,
+        'interval': 5,
+        'latency_budget': 0.5
+    },
+    # Tmp messages are deleted in batches. Failed deletions are retried until
+    # the message is `max_age` seconds old or has failed `max_attempts` times.
+    'tmp_messages': {
+        'batch_size': 100,
+        'max_age': 48 * 3600,
+        'max_attempts': 3
+    },
+    # Membership sweeps check the stored members of a group with `workers`
+    # concurrent requests, saving progress every `batch_size` members.
+    # Incremental sweeps skip members seen in the last `max_age` seconds. The
+    # last `keep` completed sweeps of a group are kept.
+    'membership_sweep': {
+        'workers': 4,
+        'batch_size': 100,
+        'max_age': 7 * 24 * 3600,
+        'keep': 5
+    },
     'bots': {
         NUBLADO_BOT: {
             'token': NUBLADO_BOT_TOKEN,
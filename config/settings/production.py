@@ -29,6 +29,9 @@ EMAIL_USE_TLS = True
 
 # Bot
 DJANGO_TELEGRAM['mode'] = BOT_MODE_WEBHOOK
+DJANGO_TELEGRAM['webhook_workers'] = 4
+DJANGO_TELEGRAM['update_dedup']['backend'] = 'database'
+DJANGO_TELEGRAM['rate_limit']['backend'] = 'database'
 
 # Heroku settings
 django_heroku.settings(locals())
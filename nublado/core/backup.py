@@ -0,0 +1,74 @@
+import gzip
+import json
+
+# Characters of text read from backup files at a time.
+READ_SIZE = 64 * 1024
+# Snapshot file names and their models, in the order they're restored.
+SNAPSHOT_MODELS = (
+    ('group_members', 'django_telegram.TelegramGroupMember'),
+    ('group_member_points', 'group_points.GroupMemberPoints'),
+    ('point_transactions', 'group_points.PointTransaction'),
+    ('points_rollups', 'group_points.PointsRollup'),
+    ('group_notes', 'bot_notes.GroupNote'),
+    ('language_days', 'language_days.LanguageDay')
+)
+WHITESPACE = " \t\r\n"
+ARRAY_SEPARATORS = WHITESPACE + ","
+
+
+def iter_json_records(f, read_size: int = READ_SIZE):
+    """Yield the values of a JSON array, or of whitespace separated JSON values, from a text file.
+
+    The file is read in chunks and each value is decoded as soon as it's
+    complete, so memory use doesn't grow with the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    array = None
+    while True:
+        separators = ARRAY_SEPARATORS if array else WHITESPACE
+        while pos < len(buffer) and buffer[pos] in separators:
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                if array:
+                    raise ValueError("Unterminated JSON array.")
+                return
+            buffer = f.read(read_size)
+            pos = 0
+            eof = not buffer
+            continue
+
+        if array is None:
+            array = buffer[pos] == "["
+            if array:
+                pos += 1
+            continue
+        if array and buffer[pos] == "]":
+            return
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # A number at the end of the buffer may continue in the next chunk.
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield value
+        pos = end
+
+
+def open_backup(path: str, mode: str = 'rt'):
+    """Open a backup file as text, compressed with gzip if its name ends with .gz."""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
@@ -0,0 +1,121 @@
+import datetime
+import json
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ...backup import SNAPSHOT_MODELS, open_backup
+
+WATERMARK_FILE = "snapshot_watermark.json"
+# Rows saved by transactions still open when an export starts can have
+# earlier update dates, so the next incremental export starts this many
+# seconds before. Restore incrementals with --replace.
+WATERMARK_OVERLAP = 300
+PROGRESS_INTERVAL = 2
+
+
+class Command(BaseCommand):
+    help = "Export the bot data as NDJSON snapshot files, in full or only the rows updated since a watermark."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.BACKUP_DIR))
+        parser.add_argument(
+            '--since',
+            help="Only export rows updated after this ISO 8601 date."
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help="Only export rows updated since the last export's watermark."
+        )
+        parser.add_argument('--compress', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=[name for name, label in SNAPSHOT_MODELS],
+            help="Only export these snapshot files. The watermark isn't advanced."
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+        watermark_path = os.path.join(output, WATERMARK_FILE)
+        started = timezone.now()
+
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError("Invalid date: {}".format(options['since']))
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        elif options['incremental']:
+            if not os.path.exists(watermark_path):
+                raise CommandError("No watermark in {}. Run a full export first.".format(output))
+            with open(watermark_path) as f:
+                since = parse_datetime(json.load(f)['watermark'])
+
+        for name, label in SNAPSHOT_MODELS:
+            if options['models'] and name not in options['models']:
+                continue
+            file_name = name if since is None else "{0}-{1}".format(name, started.strftime("%Y%m%d%H%M%S"))
+            file_name += ".jsonl.gz" if options['compress'] else ".jsonl"
+            self.export_model(
+                apps.get_model(label),
+                os.path.join(output, file_name),
+                since,
+                options['chunk_size']
+            )
+
+        if not options['models']:
+            watermark = started - datetime.timedelta(seconds=WATERMARK_OVERLAP)
+            with open(watermark_path, 'w') as f:
+                json.dump({'watermark': watermark.isoformat()}, f)
+
+    def export_model(self, model, path: str, since, chunk_size: int) -> None:
+        queryset = model._base_manager.order_by('pk')
+        if since is not None:
+            queryset = queryset.filter(date_updated__gt=since)
+
+        self.label = os.path.basename(path)
+        self.rows = 0
+        self.start = self.last_progress = time.monotonic()
+        # Written to a temporary file first, so a failed export doesn't
+        # replace the last snapshot.
+        tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path))
+        with open_backup(tmp_path, 'wt') as f:
+            serializers.serialize(
+                'jsonl',
+                # Rows are fetched in chunks through a server-side cursor.
+                self.count_rows(queryset.iterator(chunk_size=chunk_size)),
+                stream=f
+            )
+        os.replace(tmp_path, path)
+
+        elapsed = time.monotonic() - self.start
+        self.stdout.write("{label}: {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s).".format(
+            label=self.label,
+            rows=self.rows,
+            elapsed=elapsed,
+            rate=self.rows / elapsed if elapsed else 0
+        ))
+
+    def count_rows(self, objects):
+        for obj in objects:
+            self.rows += 1
+            now = time.monotonic()
+            if now - self.last_progress >= PROGRESS_INTERVAL:
+                self.last_progress = now
+                self.stdout.write("{label}: {rows} rows ({rate:.0f} rows/s)".format(
+                    label=self.label,
+                    rows=self.rows,
+                    rate=self.rows / (now - self.start)
+                ))
+            yield obj
@@ -0,0 +1,219 @@
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.db import connection, transaction
+
+from django_telegram.models import TelegramGroupMember
+from group_points.models import GroupMemberPoints
+from ...backup import SNAPSHOT_MODELS, iter_json_records, open_backup
+
+# Extensions of a snapshot's file in the backup directory, in order of
+# preference: the full exports of export_snapshot, then the older JSON arrays.
+BACKUP_EXTENSIONS = ('.jsonl.gz', '.jsonl', '.json')
+PROGRESS_INTERVAL = 2
+
+
+@contextmanager
+def keep_dates(model):
+    """Write the dates of restored rows as they are, instead of the current time of auto_now fields."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, auto_now, auto_now_add in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Restore backup files into the database in bulk batches, without sending signals."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='*',
+            help="Backup files to restore, as JSON arrays or exported NDJSON, optionally gzipped. "
+                 "Defaults to the full snapshot of each model in the backup directory."
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help="Replace existing rows instead of keeping them."
+        )
+
+    def handle(self, *args, **options):
+        paths = options['files'] or self.get_default_paths()
+        if not paths:
+            raise CommandError("No backup files in {}.".format(settings.BACKUP_DIR))
+        restored_models = set()
+        for path in paths:
+            if not os.path.exists(path):
+                raise CommandError("Backup file {} doesn't exist.".format(path))
+            try:
+                restored_models |= self.restore_file(path, options['batch_size'], options['replace'])
+            except ValueError as e:
+                raise CommandError("Backup file {0} isn't valid JSON: {1}".format(path, e))
+
+        # Rows were inserted with their primary keys, past the sequences.
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), list(restored_models))
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    def get_default_paths(self) -> list:
+        """Return the backup directory's file of each snapshot, in the order they're restored."""
+        paths = []
+        for name, label in SNAPSHOT_MODELS:
+            for extension in BACKUP_EXTENSIONS:
+                path = os.path.join(settings.BACKUP_DIR, name + extension)
+                if os.path.exists(path):
+                    paths.append(path)
+                    break
+            else:
+                self.stdout.write("No backup of {}, skipped.".format(name))
+        return paths
+
+    def restore_file(self, path: str, batch_size: int, replace: bool) -> set:
+        self.stats = {'read': 0, 'inserted': 0, 'existing': 0, 'invalid': 0}
+        self.label = os.path.basename(path)
+        self.start = self.last_progress = time.monotonic()
+        pending = {}
+        with open_backup(path) as f:
+            for record in iter_json_records(f):
+                self.stats['read'] += 1
+                instance = self.deserialize(record)
+                if instance is None:
+                    continue
+                batch = pending.setdefault(type(instance), [])
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    self.write_batch(type(instance), batch, replace)
+                    pending[type(instance)] = []
+        for model, batch in pending.items():
+            if batch:
+                self.write_batch(model, batch, replace)
+
+        elapsed = time.monotonic() - self.start
+        self.stdout.write(
+            "{label}: {read} read, {inserted} inserted, {existing} {existing_action}, "
+            "{invalid} invalid in {elapsed:.1f}s ({rate:.0f} rows/s).".format(
+                label=self.label,
+                existing_action="replaced" if replace else "skipped",
+                elapsed=elapsed,
+                rate=self.stats['read'] / elapsed if elapsed else 0,
+                **self.stats
+            )
+        )
+        return set(pending.keys())
+
+    def deserialize(self, record):
+        try:
+            return next(PythonDeserializer([record], ignorenonexistent=True)).object
+        except DeserializationError as e:
+            self.reject(record, e)
+        except StopIteration:
+            # Records of unknown models are skipped by the deserializer.
+            self.reject(record, "Unknown model.")
+        return None
+
+    def reject(self, record, error) -> None:
+        self.stats['invalid'] += 1
+        if self.stats['invalid'] <= 10:
+            self.stderr.write("{label}: invalid record {pk}: {error}".format(
+                label=self.label,
+                pk=record.get('pk') if isinstance(record, dict) else None,
+                error=error
+            ))
+
+    def validate_batch(self, model, batch: list) -> list:
+        """Return the valid instances of a batch, checking relations with one query per relation."""
+        if model is GroupMemberPoints:
+            # Older backups don't have the points' copy of the group id.
+            group_ids = dict(
+                TelegramGroupMember.objects.filter(
+                    id__in=[instance.group_member_id for instance in batch]
+                ).values_list('id', 'group_id')
+            )
+            for instance in batch:
+                if instance.group_id is None:
+                    instance.group_id = group_ids.get(instance.group_member_id)
+
+        relations = [field for field in model._meta.concrete_fields if field.is_relation]
+        existing = {}
+        for field in relations:
+            existing[field.attname] = set(
+                field.related_model._base_manager.filter(
+                    pk__in=[getattr(instance, field.attname) for instance in batch]
+                ).values_list('pk', flat=True)
+            )
+
+        nullable = [field for field in model._meta.concrete_fields if field.null]
+        valid = []
+        for instance in batch:
+            try:
+                for field in relations:
+                    value = getattr(instance, field.attname)
+                    if value is not None and value not in existing[field.attname]:
+                        raise ValidationError({field.name: "Related row {} doesn't exist.".format(value)})
+                # Relations are checked in bulk above instead of a query per
+                # field, and null values are valid in the database even if
+                # the fields can't be blank in forms.
+                exclude = [field.name for field in relations] + [
+                    field.name for field in nullable if getattr(instance, field.attname) is None
+                ]
+                instance.clean_fields(exclude=exclude)
+            except ValidationError as e:
+                self.reject({'pk': instance.pk}, e)
+                continue
+            valid.append(instance)
+        return valid
+
+    def write_batch(self, model, batch: list, replace: bool) -> None:
+        batch = self.validate_batch(model, batch)
+        with transaction.atomic(), keep_dates(model):
+            existing_pks = set(
+                model._base_manager.filter(
+                    pk__in=[instance.pk for instance in batch]
+                ).values_list('pk', flat=True)
+            )
+            existing = [instance for instance in batch if instance.pk in existing_pks]
+            new = [instance for instance in batch if instance.pk not in existing_pks]
+            if replace and existing:
+                if model._meta.related_objects:
+                    # Updated rather than deleted, which would cascade to
+                    # related rows that may not be in the backup.
+                    model._base_manager.bulk_update(
+                        existing,
+                        [field.name for field in model._meta.concrete_fields if not field.primary_key],
+                        batch_size=100
+                    )
+                else:
+                    model._base_manager.filter(pk__in=existing_pks).delete()
+                    new = batch
+            model._base_manager.bulk_create(new, ignore_conflicts=True)
+        self.stats['existing'] += len(existing)
+        self.stats['inserted'] += len(batch) - len(existing)
+
+        now = time.monotonic()
+        if now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.stdout.write("{label}: {read} rows ({rate:.0f} rows/s)".format(
+                label=self.label,
+                read=self.stats['read'],
+                rate=self.stats['read'] / (now - self.start)
+            ))
@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import tempfile
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from django_telegram.models import TelegramGroupMember
+from group_points.models import PointTransaction
+from .backup import iter_json_records
+
+OLD_DATE = datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+def get_member_record(pk, display_name: str) -> dict:
+    return {
+        'model': 'django_telegram.telegramgroupmember',
+        'pk': str(pk),
+        'fields': {
+            'user_id': 1,
+            'group_id': -100,
+            'display_name': display_name,
+            'date_created': OLD_DATE.isoformat(),
+            'date_updated': OLD_DATE.isoformat()
+        }
+    }
+
+
+def get_transaction_record(pk: int, delta: int) -> dict:
+    return {
+        'model': 'group_points.pointtransaction',
+        'pk': pk,
+        'fields': {
+            'group_id': -100,
+            'giver_id': 1,
+            'receiver_id': 2,
+            'delta': delta,
+            'date_created': OLD_DATE.isoformat(),
+            'date_updated': OLD_DATE.isoformat()
+        }
+    }
+
+
+class IterJsonRecordsTests(SimpleTestCase):
+    records = [{'pk': i, 'text': "a, b ]" * i} for i in range(20)] + [12345]
+
+    def test_array(self):
+        f = StringIO(json.dumps(self.records))
+        self.assertEqual(list(iter_json_records(f, read_size=7)), self.records)
+
+    def test_lines(self):
+        f = StringIO("\n".join(json.dumps(record) for record in self.records) + "\n")
+        self.assertEqual(list(iter_json_records(f, read_size=7)), self.records)
+
+    def test_unterminated_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_records(StringIO('[{"pk": 1}, ')))
+
+
+class RestoreBackupTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def restore(self, records: list, *args) -> None:
+        path = os.path.join(self.dir.name, "backup.jsonl")
+        with open(path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        call_command('restore_backup', path, *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_inserted_rows_keep_dates(self):
+        pk = uuid.uuid4()
+        self.restore([get_member_record(pk, "old"), get_transaction_record(1, 1)])
+        member = TelegramGroupMember.objects.get(id=pk)
+        self.assertEqual((member.date_created, member.date_updated), (OLD_DATE, OLD_DATE))
+        self.assertEqual(PointTransaction.objects.get(id=1).date_updated, OLD_DATE)
+
+    def test_replaced_rows_keep_dates(self):
+        pk = uuid.uuid4()
+        TelegramGroupMember.objects.create_group_member(id=pk, user_id=1, group_id=-100, display_name="new")
+        PointTransaction.objects.create(id=1, group_id=-100, giver_id=1, receiver_id=2, delta=5)
+        self.restore([get_member_record(pk, "old"), get_transaction_record(1, 1)], '--replace')
+        # Members have related rows, so they're updated rather than recreated.
+        member = TelegramGroupMember.objects.get(id=pk)
+        self.assertEqual(member.display_name, "old")
+        self.assertEqual((member.date_created, member.date_updated), (OLD_DATE, OLD_DATE))
+        point_transaction = PointTransaction.objects.get(id=1)
+        self.assertEqual((point_transaction.delta, point_transaction.date_updated), (1, OLD_DATE))
+
+    def test_existing_rows_kept(self):
+        pk = uuid.uuid4()
+        TelegramGroupMember.objects.create_group_member(id=pk, user_id=1, group_id=-100, display_name="new")
+        self.restore([get_member_record(pk, "old")])
+        self.assertEqual(TelegramGroupMember.objects.get(id=pk).display_name, "new")
+
+    def test_auto_now_restored(self):
+        self.restore([get_member_record(uuid.uuid4(), "old")])
+        member = TelegramGroupMember.objects.get()
+        member.save()
+        self.assertGreater(member.date_updated, OLD_DATE)
+        self.assertTrue(TelegramGroupMember._meta.get_field('date_updated').auto_now)
+
+    def test_invalid_records_skipped(self):
+        records = [get_transaction_record(1, 1), get_transaction_record(2, 1), {'model': 'core.unknown'}]
+        records[1]['fields']['giver_id'] = -1
+        self.restore(records)
+        self.assertEqual(list(PointTransaction.objects.values_list('id', flat=True)), [1])
+
+
+class SnapshotRoundTripTests(TestCase):
+    def test_export_and_restore_defaults(self):
+        with tempfile.TemporaryDirectory() as backup_dir, override_settings(BACKUP_DIR=backup_dir):
+            member = TelegramGroupMember.objects.create_group_member(user_id=1, group_id=-100, display_name="a")
+            TelegramGroupMember.objects.filter(id=member.id).update(date_updated=OLD_DATE)
+            call_command('export_snapshot', '--compress', stdout=StringIO())
+            TelegramGroupMember.objects.all().delete()
+            call_command('restore_backup', stdout=StringIO())
+        member = TelegramGroupMember.objects.get(id=member.id)
+        self.assertEqual((member.display_name, member.date_updated), ("a", OLD_DATE))
+        self.assertLess(member.date_created, timezone.now())
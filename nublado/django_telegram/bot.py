@@ -2,17 +2,27 @@ import os
 import datetime
 import pytz
 import logging
+from contextlib import nullcontext
 
 from core.utils import remove_lead_and_trail_slash
 from telegram import ParseMode, Update
-from telegram.ext import Defaults, ExtBot as TelegramBot, Updater, CommandHandler, Dispatcher
+from telegram.error import TelegramError
+from telegram.ext import Defaults, Updater, CommandHandler, Dispatcher
+from telegram.utils.request import Request
 
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ImproperlyConfigured
 
+from .dedup import get_dedup_window
+from .outbound import OutboundBot as TelegramBot, ReplyCapture, capture_reply, get_rate_limiter
+from .prefilter import UpdatePrefilter
+from .workers import UpdateScheduler
+
 logger = logging.getLogger('django')
 
+UPDATER_WORKERS = 4
+
 bot_mode_error = "Bot mode must be polling or webhooks."
 django_telegram_settings_error = "DJANGO_TELEGRAM settings are missing or improperly configured."
 
@@ -21,22 +31,49 @@ class Bot(object):
     def __init__(self, token: str):
         self.token = token
         defaults = Defaults(parse_mode=ParseMode.MARKDOWN)
-        self.telegram_bot = TelegramBot(
-            self.token,
-            defaults=defaults
-        )
         self.updater = None
         self.dispatcher = None
         self.job_queue = None
+        self.scheduler = None
+        self.prefilter = UpdatePrefilter()
+        # Update types consumed by each handler (None to derive them from the handler).
+        self.handler_update_types = {}
         self.running = False
 
+        dt = settings.DJANGO_TELEGRAM
+        self.dedup = get_dedup_window(self.token, dt.get('update_dedup'))
+        self.webhook_reply = dt.get('webhook_reply', False)
+        self.webhook_reply_timeout = dt.get('webhook_reply_timeout', 0.5)
+        webhook_workers = dt.get('webhook_workers', 0)
+        # Membership sweeps make concurrent requests alongside the handlers.
+        sweep_workers = dt.get('membership_sweep', {}).get('workers', 4)
+        if dt['mode'] == settings.BOT_MODE_WEBHOOK and webhook_workers > 0:
+            self.scheduler = UpdateScheduler(
+                self.process_update,
+                num_lanes=webhook_workers,
+                queue_size=dt.get('webhook_queue_size', 100),
+                drain_timeout=dt.get('webhook_drain_timeout', 10)
+            )
+            # Each worker thread needs its own connection to the Telegram API.
+            request = Request(con_pool_size=webhook_workers + sweep_workers + 4)
+        elif dt['mode'] == settings.BOT_MODE_POLLING:
+            # The updater's default pool size, plus the sweep's workers.
+            request = Request(con_pool_size=UPDATER_WORKERS + sweep_workers + 4)
+        else:
+            request = Request(con_pool_size=sweep_workers + 4)
+        self.telegram_bot = TelegramBot(
+            self.token,
+            request=request,
+            defaults=defaults,
+            rate_limiter=get_rate_limiter(dt.get('rate_limit'))
+        )
+
         try:
-            dt = settings.DJANGO_TELEGRAM
             if dt['mode'] == settings.BOT_MODE_POLLING:
                 self.updater = Updater(
-                    self.token,
-                    use_context=True,
-                    defaults=defaults
+                    bot=self.telegram_bot,
+                    workers=UPDATER_WORKERS,
+                    use_context=True
                 )
                 self.job_queue = self.updater.job_queue
                 self.dispatcher = self.updater.dispatcher
@@ -53,29 +90,112 @@ class Bot(object):
                 dt = settings.DJANGO_TELEGRAM
                 if dt['mode'] == settings.BOT_MODE_POLLING:
                     logger.info("Bot mode: polling")
-                    self.updater.start_polling()
+                    self.updater.start_polling(
+                        allowed_updates=self.prefilter.allowed_updates()
+                    )
                     self.updater.idle()
                 elif dt['mode'] == settings.BOT_MODE_WEBHOOK:
                     logger.info("Bot mode: webhooks")
                     webhook_site = remove_lead_and_trail_slash(dt['webhook_site'])
                     webhook_path = remove_lead_and_trail_slash(dt['webhook_path'])
                     webhook_url = f"{webhook_site}/{webhook_path}/{self.token}/"
-                    self.telegram_bot.set_webhook(webhook_url)
+                    self.telegram_bot.set_webhook(
+                        webhook_url,
+                        allowed_updates=self.prefilter.allowed_updates()
+                    )
                 else:
                     raise ImproperlyConfigured(bot_mode_error)
                 self.running = True
             except:
                 raise ImproperlyConfigured(django_telegram_settings_error)
 
-    def add_handler(self, handler, handler_group: int = 0):
+    def process_update(self, data: dict, reply_in_response: bool = False, capture: ReplyCapture = None):
+        """Deserialize an update received from Telegram and dispatch it.
+
+        With reply_in_response, or a capture from the webhook request, the first
+        eligible request made by the handlers isn't sent but returned, to be
+        answered in the webhook response.
+        """
+        if capture is None and reply_in_response:
+            capture = ReplyCapture()
+        update = Update.de_json(data, self.telegram_bot)
+        with capture_reply(capture) if capture is not None else nullcontext():
+            try:
+                self.dispatcher.process_update(update)
+                logger.debug("Bot <{}> : Processed update {}".format(
+                    self.telegram_bot.username,
+                    update
+                ))
+            except TelegramError as te:
+                logger.warn("Bot <{}> : Error was raised while processing Update.".format(
+                    self.telegram_bot.username
+                ))
+                self.dispatcher.dispatch_error(update, te)
+            finally:
+                if capture is not None:
+                    capture.done.set()
+        return capture.reply if capture is not None else None
+
+    def receive_update(self, data: dict):
+        """Queue an update on its chat's lane or, without a scheduler, process it right away.
+
+        Returns the webhook response body, or None if the update couldn't be accepted.
+        """
+        if not self.prefilter.accepts(data):
+            return {}
+        update_id = data.get('update_id')
+        if self.dedup is not None and self.dedup.is_duplicate(update_id):
+            logger.info("Bot <{}> : Skipped redelivered update {}".format(
+                self.telegram_bot.username,
+                update_id
+            ))
+            return {}
+        try:
+            if self.scheduler is not None:
+                capture = ReplyCapture() if self.webhook_reply else None
+                if self.scheduler.submit(data, capture):
+                    return self.wait_for_reply(capture)
+                reply = None
+            else:
+                reply = self.process_update(data, reply_in_response=self.webhook_reply) or {}
+        except Exception:
+            self.release_update(update_id)
+            raise
+        if reply is None:
+            # Telegram redelivers updates that weren't accepted.
+            self.release_update(update_id)
+        return reply
+
+    def wait_for_reply(self, capture: ReplyCapture) -> dict:
+        """Wait for a queued update's webhook reply, for up to the reply timeout.
+
+        Once a reply is claimed, the update is waited for until it's processed,
+        so the handlers' other requests are made before the reply is answered.
+        """
+        if capture is None:
+            return {}
+        if not capture.done.wait(self.webhook_reply_timeout) and capture.abandon():
+            return {}
+        capture.done.wait()
+        return capture.reply or {}
+
+    def release_update(self, update_id) -> None:
+        if self.dedup is not None:
+            self.dedup.release(update_id)
+
+    def add_handler(self, handler, handler_group: int = 0, update_types: list = None):
         try:
             self.dispatcher.add_handler(handler, group=handler_group)
+            self.handler_update_types[handler] = update_types
+            self.prefilter.refresh(self.handler_update_types.items())
         except:
             logger.error(f"Error adding handler {handler}")
 
     def remove_handler(self, handler, handler_group:int = 0):
         try:
             self.dispatcher.remove_handler(handler, group=handler_group)
+            self.handler_update_types.pop(handler, None)
+            self.prefilter.refresh(self.handler_update_types.items())
         except:
             logger.error(f"Error removing handler {handler}")
 
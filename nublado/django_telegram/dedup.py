@@ -0,0 +1,102 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('django')
+
+DEDUP_BACKEND_MEMORY = "memory"
+DEDUP_BACKEND_DATABASE = "database"
+
+
+class UpdateDedupWindow(object):
+    """Remember the last `size` update ids received in this process."""
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self.update_ids = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_duplicate(self, update_id: int) -> bool:
+        """Record an update id and return whether it had already been received.
+
+        If the update then isn't accepted or processed, its id must be released
+        so Telegram's redelivery isn't skipped. Updates without an id can't be
+        de-duplicated and are never duplicates.
+        """
+        if update_id is None:
+            return False
+        with self.lock:
+            if update_id in self.update_ids:
+                self.hits += 1
+                return True
+            self.update_ids[update_id] = None
+            if len(self.update_ids) > self.size:
+                self.update_ids.popitem(last=False)
+            self.misses += 1
+            return False
+
+    def release(self, update_id: int) -> None:
+        """Forget an update id, so a redelivery of the update is processed."""
+        with self.lock:
+            self.update_ids.pop(update_id, None)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.update_ids),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class DatabaseUpdateDedupWindow(UpdateDedupWindow):
+    """Remember the last `size` update ids in the database.
+
+    The window survives restarts and is shared by every process serving the bot.
+    Update ids increase sequentially, so older rows are purged by update id.
+    """
+    def __init__(self, bot_id: int, size: int = 1000):
+        super().__init__(size)
+        # Models can't be imported while bot.py is loaded by the app config.
+        from .models import ProcessedUpdate
+        self.model = ProcessedUpdate
+        self.bot_id = bot_id
+        # Purge every tenth of the window to keep the table bounded.
+        self.purge_interval = max(size // 10, 1)
+        self.recorded = 0
+
+    def is_duplicate(self, update_id: int) -> bool:
+        if update_id is None:
+            return False
+        # Updates redelivered to this process are caught without a query.
+        if super().is_duplicate(update_id):
+            return True
+        if self.model.objects.record_update(self.bot_id, update_id):
+            with self.lock:
+                self.recorded += 1
+                purge = self.recorded % self.purge_interval == 0
+            if purge:
+                self.model.objects.purge(self.bot_id, update_id - self.size)
+            return False
+        with self.lock:
+            self.hits += 1
+            self.misses -= 1
+        return True
+
+    def release(self, update_id: int) -> None:
+        if update_id is None:
+            return
+        super().release(update_id)
+        self.model.objects.filter(bot_id=self.bot_id, update_id=update_id).delete()
+
+
+def get_dedup_window(token: str, dedup_settings: dict = None):
+    """Return an update de-duplication window for a bot, or None if disabled."""
+    if not dedup_settings:
+        return None
+    size = dedup_settings.get('size', 1000)
+    backend = dedup_settings.get('backend', DEDUP_BACKEND_MEMORY)
+    if backend == DEDUP_BACKEND_DATABASE:
+        bot_id = int(token.split(':')[0])
+        return DatabaseUpdateDedupWindow(bot_id, size)
+    return UpdateDedupWindow(size)
@@ -1,37 +1,156 @@
+import datetime
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from telegram import Bot
+from telegram.constants import (
+    CHATMEMBER_CREATOR, CHATMEMBER_ADMINISTRATOR, CHATMEMBER_MEMBER,
+    CHATMEMBER_RESTRICTED, CHATMEMBER_LEFT, CHATMEMBER_KICKED
+)
+from telegram.error import BadRequest, RetryAfter, TelegramError
 
-from ..models import TelegramGroupMember
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..managers import MembersAdded
+from ..models import MembershipCheck, MembershipSweep, TelegramGroupMember
+from ..outbound import PRIORITY_LOW
+from .group import member_status_cache
 
 logger = logging.getLogger('django')
 
+MEMBERSHIP_SWEEP = settings.DJANGO_TELEGRAM.get('membership_sweep', {})
+LEFT_STATUSES = (CHATMEMBER_LEFT, CHATMEMBER_KICKED)
+ALL_STATUSES = (
+    CHATMEMBER_CREATOR, CHATMEMBER_ADMINISTRATOR, CHATMEMBER_MEMBER,
+    CHATMEMBER_RESTRICTED, CHATMEMBER_LEFT, CHATMEMBER_KICKED
+)
+# Errors meaning the user isn't in the group.
+MEMBER_GONE_ERRORS = (
+    "user not found",
+    "participant_id_invalid",
+    "user_id_invalid"
+)
+
+# Groups being swept by this process.
+_sweeping_groups = set()
+_sweeping_lock = threading.Lock()
+
 
 def update_group_members_from_admins(bot: Bot, group_id: int):
-    """Updates group members in database with admins in telegram group."""
+    """Add the admins of a telegram group to its members in the database.
+
+    Returns the inserted and existing admin counts, or None if the admins
+    couldn't be requested.
+    """
     try:
         group_admins = bot.get_chat_administrators(group_id)
-        for group_admin in group_admins:
-            user = group_admin.user
-            group_member, group_member_created = TelegramGroupMember.objects.get_or_create(
-                group_id=group_id,
-                user_id=user.id
-            )
-        logger.info(TelegramGroupMember.objects.count())
-        return TelegramGroupMember.objects.all()
-    except:
+    except TelegramError as e:
+        logger.error(f"Error getting administrators of {group_id}: {e}")
         return None
 
+    # Demoted admins may still be cached as admins.
+    member_status_cache.invalidate_chat(group_id)
+    for group_admin in group_admins:
+        member_status_cache.set(group_id, group_admin.user.id, group_admin.status)
+    members_added = TelegramGroupMember.objects.add_members(
+        group_id,
+        [group_admin.user.id for group_admin in group_admins]
+    )
+    logger.info(
+        f"Admins of {group_id} added to members: {len(members_added.inserted)} inserted, "
+        f"{members_added.existing} existing."
+    )
+    return MembersAdded(
+        inserted=len(members_added.inserted),
+        existing=members_added.existing
+    )
+
+
+def check_member(bot: Bot, group_id: int, user_id: int) -> tuple:
+    """Check whether a user is in a group. Return a (user_id, result, detail) tuple."""
+    try:
+        chat_member = bot.get_chat_member(group_id, user_id)
+    except BadRequest as e:
+        if e.message.lower() in MEMBER_GONE_ERRORS:
+            return user_id, MembershipCheck.RESULT_LEFT, e.message
+        return user_id, MembershipCheck.RESULT_ERROR, e.message
+    except RetryAfter as e:
+        rate_limiter = getattr(bot, 'rate_limiter', None)
+        if rate_limiter is not None:
+            rate_limiter.back_off(None, e.retry_after)
+        return user_id, MembershipCheck.RESULT_ERROR, e.message
+    except TelegramError as e:
+        return user_id, MembershipCheck.RESULT_ERROR, e.message
+
+    status = chat_member.status
+    if status in LEFT_STATUSES or (status == CHATMEMBER_RESTRICTED and not chat_member.is_member):
+        return user_id, MembershipCheck.RESULT_LEFT, status
+    return user_id, MembershipCheck.RESULT_MEMBER, status
+
+
+def get_non_group_members(bot: Bot, group_id: int, incremental: bool = False):
+    """Check which stored members of a group are no longer in it.
+
+    Members are checked concurrently by a bounded pool of threads, in batches
+    saved with the sweep's checkpoint, so an interrupted sweep resumes where
+    it stopped. An incremental sweep only checks members not seen in the last
+    `max_age` seconds. Failed checks are saved as errors, not as members that
+    left.
+
+    Returns the completed sweep, or None if the group is already being swept.
+    """
+    workers = MEMBERSHIP_SWEEP.get('workers', 4)
+    batch_size = MEMBERSHIP_SWEEP.get('batch_size', 100)
+    max_age = MEMBERSHIP_SWEEP.get('max_age', 7 * 24 * 3600)
+
+    with _sweeping_lock:
+        if group_id in _sweeping_groups:
+            return None
+        _sweeping_groups.add(group_id)
+    try:
+        seen_before = timezone.now() - datetime.timedelta(seconds=max_age) if incremental else None
+        sweep = MembershipSweep.objects.start_sweep(group_id, seen_before)
+        if sweep.last_user_id:
+            logger.info(f"Resuming membership sweep of {group_id} after user {sweep.last_user_id}.")
+        queryset = TelegramGroupMember.objects.filter(group_id=group_id).order_by('user_id')
+        if sweep.seen_before is not None:
+            queryset = queryset.filter(
+                Q(date_last_seen__isnull=True) | Q(date_last_seen__lt=sweep.seen_before)
+            )
+
+        rate_limiter = getattr(bot, 'rate_limiter', None)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="membership_sweep") as executor:
+            while True:
+                user_ids = list(
+                    queryset.filter(
+                        user_id__gt=sweep.last_user_id
+                    ).values_list('user_id', flat=True)[:batch_size]
+                )
+                if not user_ids:
+                    break
+                futures = []
+                for user_id in user_ids:
+                    if rate_limiter is not None:
+                        # Checks are taken from the global bucket and yield to
+                        # interactive requests.
+                        rate_limiter.wait(priority=PRIORITY_LOW)
+                    futures.append(executor.submit(check_member, bot, group_id, user_id))
+                checks = [future.result() for future in futures]
+                MembershipSweep.objects.record_batch(sweep, checks, timezone.now())
+                for user_id, result, detail in checks:
+                    if result != MembershipCheck.RESULT_ERROR:
+                        member_status_cache.set(group_id, user_id, detail if detail in ALL_STATUSES else None)
 
-def get_non_group_members(bot: Bot, group_id: int):
-    """Returns "stragglers" that aren't currently part of a a group."""
-    logger.info("SHIT")
-    group_members = TelegramGroupMember.objects.filter(group_id=group_id).all()
-    non_members = []
-    if group_members:
-        for group_member in group_members:
-            try:
-                member = bot.get_chat_member(group_id, group_member.user_id)
-            except:
-                non_members.append(group_member.user_id)
-    logger.info(non_members)
\ No newline at end of file
+        MembershipSweep.objects.complete(sweep, timezone.now())
+        MembershipSweep.objects.purge(group_id, MEMBERSHIP_SWEEP.get('keep', 5))
+        logger.info(
+            f"Membership sweep of {group_id}: checked {sweep.checked}, "
+            f"left {sweep.left}, errors {sweep.errors}."
+        )
+        return sweep
+    finally:
+        with _sweeping_lock:
+            _sweeping_groups.discard(group_id)
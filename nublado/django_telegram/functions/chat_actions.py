@@ -1,18 +1,117 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
 from functools import wraps
 
-from telegram import ChatAction, Update
+from cachetools import TTLCache
+from telegram import Bot, ChatAction, Update
 from telegram.ext import CallbackContext
 
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger('django')
+
+CHAT_ACTIONS = settings.DJANGO_TELEGRAM.get('chat_actions', {})
+
+
+class ChatActionJob(object):
+    def __init__(self, bot: Bot, chat_id: int, action: str):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.action = action
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class ChatActionSender(object):
+    """Send chat actions from a background thread, at most one per chat and action per interval.
+
+    Telegram displays a chat action for about five seconds, so sending it
+    again within that interval has no visible effect.
+    """
+    def __init__(self, interval: float = 5):
+        self.interval = interval
+        self.jobs = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.last_sent = TTLCache(maxsize=1000, ttl=interval)
+
+    def schedule(self, bot: Bot, chat_id: int, action: str, delay: float = 0):
+        """Send a chat action after a delay unless the returned job is cancelled first."""
+        job = ChatActionJob(bot, chat_id, action)
+        with self.condition:
+            if (chat_id, action) in self.last_sent:
+                job.cancel()
+                return job
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._work,
+                    name="chat_action_sender",
+                    daemon=True
+                )
+                self.thread.start()
+            heapq.heappush(self.jobs, (time.monotonic() + delay, next(self.counter), job))
+            self.condition.notify()
+        return job
+
+    def _work(self) -> None:
+        while True:
+            with self.condition:
+                while not self.jobs or self.jobs[0][0] > time.monotonic():
+                    timeout = self.jobs[0][0] - time.monotonic() if self.jobs else None
+                    self.condition.wait(timeout)
+                due, count, job = heapq.heappop(self.jobs)
+                key = (job.chat_id, job.action)
+                if job.cancelled or key in self.last_sent:
+                    continue
+                self.last_sent[key] = True
+            try:
+                job.bot.send_chat_action(
+                    chat_id=job.chat_id,
+                    action=job.action
+                )
+            except Exception as e:
+                logger.info(f"Error sending chat action {job.action} to {job.chat_id}: {e}")
+            finally:
+                # The rate limiter's database backend uses this thread's connection.
+                close_old_connections()
+
+
+chat_action_sender = ChatActionSender(
+    interval=CHAT_ACTIONS.get('interval', 5)
+)
+
+
+def send_action(action, latency_budget: float = None):
+    """Show a chat action while the command runs.
+
+    The action is only sent if the command is still running after
+    `latency_budget` seconds, and the command never waits for it.
+    """
+    if latency_budget is None:
+        latency_budget = CHAT_ACTIONS.get('latency_budget', 0)
 
-def send_action(action):
     def decorator(func):
         @wraps(func)
         def command_func(update: Update, context: CallbackContext, *args, **kwargs):
-            context.bot.send_chat_action(
-                chat_id=update.effective_message.chat_id,
-                action=action
+            if not CHAT_ACTIONS.get('enabled', True) or update.effective_message is None:
+                return func(update, context, *args, **kwargs)
+            job = chat_action_sender.schedule(
+                context.bot,
+                update.effective_message.chat_id,
+                action,
+                delay=latency_budget
             )
-            return func(update, context, *args, **kwargs)
+            try:
+                return func(update, context, *args, **kwargs)
+            finally:
+                job.cancel()
         return command_func
 
     return decorator
@@ -20,4 +119,4 @@ def send_action(action):
 
 send_typing_action = send_action(ChatAction.TYPING)
 send_upload_photo_action = send_action(ChatAction.UPLOAD_PHOTO)
-send_upload_video_action = send_action(ChatAction.UPLOAD_VIDEO)
\ No newline at end of file
+send_upload_video_action = send_action(ChatAction.UPLOAD_VIDEO)
@@ -1,8 +1,11 @@
 import logging
+from functools import wraps
 
-from telegram import Bot, Message
+from telegram import Bot, Message, Update
+from telegram.ext import CallbackContext
 
 from ..models import TelegramGroupMember
+from ..outbound import reply_eligible
 
 logger = logging.getLogger('django')
 
@@ -23,3 +26,16 @@ def parse_command_last_arg_text(
             return None
     else:
         return False
+
+
+def reply_in_response(func):
+    """Let the first message a command sends be answered in the webhook response.
+
+    The call returns True instead of the sent message, so only use it on
+    commands that ignore the result.
+    """
+    @wraps(func)
+    def command_func(update: Update, context: CallbackContext, *args, **kwargs):
+        with reply_eligible():
+            return func(update, context, *args, **kwargs)
+    return command_func
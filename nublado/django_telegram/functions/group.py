@@ -1,14 +1,20 @@
 import logging
 import random
+import threading
+import time
 from functools import wraps
 
+from cachetools import TTLCache
 from telegram import Update, Bot
+from telegram.error import BadRequest, TelegramError
 from telegram.utils.helpers import escape_markdown
 from telegram.constants import (
     CHATMEMBER_CREATOR, CHATMEMBER_ADMINISTRATOR, CHATMEMBER_MEMBER,
-    CHAT_PRIVATE, CHAT_GROUP, CHAT_SUPERGROUP
+    CHATMEMBER_LEFT, CHAT_PRIVATE, CHAT_GROUP, CHAT_SUPERGROUP
+)
+from telegram.ext import (
+    CallbackContext, ChatMemberHandler, MessageHandler, Filters
 )
-from telegram.ext import CallbackContext
 
 from django.conf import settings
 
@@ -26,13 +32,142 @@ GROUP_TYPES = [
     CHAT_SUPERGROUP
 ]
 BOTS = settings.DJANGO_TELEGRAM['bots']
+MEMBER_STATUS_CACHE = settings.DJANGO_TELEGRAM.get('member_status_cache', {})
+MEMBER_SAMPLER = settings.DJANGO_TELEGRAM.get('member_sampler', {})
+
+
+class MemberStatusCache(object):
+    """A size and time bounded cache of member statuses by chat and user."""
+    # Cached value for users that aren't in the chat.
+    NON_MEMBER = None
+
+    def __init__(self, maxsize: int = 1000, ttl: int = 300):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id: int, user_id: int, default=None):
+        with self.lock:
+            try:
+                status = self.cache[(chat_id, user_id)]
+                self.hits += 1
+                return status
+            except KeyError:
+                self.misses += 1
+                return default
+
+    def set(self, chat_id: int, user_id: int, status: str) -> None:
+        with self.lock:
+            self.cache[(chat_id, user_id)] = status
+
+    def invalidate(self, chat_id: int, user_id: int) -> None:
+        with self.lock:
+            self.cache.pop((chat_id, user_id), None)
+
+    def invalidate_chat(self, chat_id: int) -> None:
+        with self.lock:
+            for key in [key for key in self.cache.keys() if key[0] == chat_id]:
+                self.cache.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+member_status_cache = MemberStatusCache(
+    maxsize=MEMBER_STATUS_CACHE.get('maxsize', 1000),
+    ttl=MEMBER_STATUS_CACHE.get('ttl', 300)
+)
+
+
+class GroupMemberIds(object):
+    """The user ids of a group's members, with O(1) insertion, removal and sampling."""
+    def __init__(self, user_ids: list):
+        self.user_ids = list(user_ids)
+        self.positions = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.loaded = time.monotonic()
+
+    def add(self, user_id: int) -> None:
+        if user_id not in self.positions:
+            self.positions[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+
+    def remove(self, user_id: int) -> None:
+        position = self.positions.pop(user_id, None)
+        if position is not None:
+            # Move the last id into the removed one's place.
+            last_user_id = self.user_ids.pop()
+            if last_user_id != user_id:
+                self.user_ids[position] = last_user_id
+                self.positions[last_user_id] = position
+
+
+class GroupMemberSampler(object):
+    """Sample random group members from cached arrays of member ids.
+
+    A group's ids are loaded once and kept up to date as members are added
+    and removed. They're reloaded after `ttl` seconds to pick up changes
+    made by other processes.
+    """
+    def __init__(self, ttl: int = 600):
+        self.ttl = ttl
+        self.groups = {}
+        self.lock = threading.Lock()
+
+    def get_member_ids(self, group_id: int) -> GroupMemberIds:
+        with self.lock:
+            member_ids = self.groups.get(group_id)
+            if member_ids is None or time.monotonic() - member_ids.loaded > self.ttl:
+                member_ids = self.groups[group_id] = GroupMemberIds(
+                    TelegramGroupMember.objects.filter(
+                        group_id=group_id
+                    ).values_list('user_id', flat=True)
+                )
+            return member_ids
+
+    def add(self, group_id: int, user_id: int) -> None:
+        with self.lock:
+            if group_id in self.groups:
+                self.groups[group_id].add(user_id)
+
+    def remove(self, group_id: int, user_id: int) -> None:
+        with self.lock:
+            if group_id in self.groups:
+                self.groups[group_id].remove(user_id)
+
+    def sample(self, group_id: int, k: int = 1) -> list:
+        """Return the user ids of up to k distinct random members."""
+        member_ids = self.get_member_ids(group_id)
+        with self.lock:
+            return random.sample(member_ids.user_ids, min(k, len(member_ids.user_ids)))
+
+
+member_sampler = GroupMemberSampler(
+    ttl=MEMBER_SAMPLER.get('ttl', 600)
+)
+
+
+def get_random_group_members(group_id: int, k: int = 1) -> list:
+    """Return up to k distinct random members of a group."""
+    user_ids = member_sampler.sample(group_id, k)
+    if not user_ids:
+        return []
+    return list(
+        TelegramGroupMember.objects.filter(
+            group_id=group_id,
+            user_id__in=user_ids
+        )
+    )
 
 
 def get_random_group_member(group_id: int):
-    members = TelegramGroupMember.objects.filter(group_id=group_id)
-    if len(members) > 0:
-        index = random.randint(0, len(members) - 1)
-        return members[index]
+    members = get_random_group_members(group_id)
+    if members:
+        return members[0]
     else:
         return None
 
@@ -47,6 +182,51 @@ def get_chat_member(bot: Bot, user_id: int, chat_id: int):
         return None
 
 
+def get_member_status(bot: Bot, user_id: int, chat_id: int):
+    """Return a user's member status in a chat, or None if the user isn't in the chat."""
+    missing = object()
+    status = member_status_cache.get(chat_id, user_id, missing)
+    if status is missing:
+        try:
+            chat_member = bot.get_chat_member(chat_id, user_id)
+            status = chat_member.status
+        except BadRequest:
+            # The user was never in the chat.
+            status = MemberStatusCache.NON_MEMBER
+        except TelegramError:
+            # Don't cache transient errors.
+            return None
+        member_status_cache.set(chat_id, user_id, status)
+    return status
+
+
+def update_member_status(update: Update, context: CallbackContext) -> None:
+    """Keep cached member statuses in sync with membership updates."""
+    chat_id = update.effective_chat.id
+    chat_member_updated = update.chat_member or update.my_chat_member
+    if chat_member_updated:
+        new_chat_member = chat_member_updated.new_chat_member
+        member_status_cache.set(chat_id, new_chat_member.user.id, new_chat_member.status)
+    elif update.message:
+        if update.message.new_chat_members:
+            for user in update.message.new_chat_members:
+                member_status_cache.invalidate(chat_id, user.id)
+        if update.message.left_chat_member:
+            user = update.message.left_chat_member
+            member_status_cache.set(chat_id, user.id, CHATMEMBER_LEFT)
+
+
+# Listen for membership changes to update cached member statuses.
+member_status_handler = MessageHandler(
+    Filters.status_update.new_chat_members | Filters.status_update.left_chat_member,
+    update_member_status
+)
+chat_member_status_handler = ChatMemberHandler(
+    update_member_status,
+    ChatMemberHandler.ANY_CHAT_MEMBER
+)
+
+
 def is_group_chat(bot: Bot, chat_id: int) -> bool:
     """Return whether chat is a group chat."""
     try:
@@ -59,7 +239,30 @@ def is_group_chat(bot: Bot, chat_id: int) -> bool:
 
 def is_group(bot: Bot, chat_id: int, group_id: int) -> bool:
     """Returns whether chat is a specific group chat by id"""
-    return is_group_chat(bot, chat_id) and chat_id == group_id
+    return chat_id == group_id and is_group_chat(bot, chat_id)
+
+
+def is_allowed_chat(
+        update: Update,
+        group_id: int,
+        group_chat: bool = True,
+        private_chat: bool = True
+) -> bool:
+    """Return whether an update comes from the group or from a private chat with its user.
+
+    Only the chat in the update is checked, without calling the API.
+    """
+    chat = update.effective_chat
+    user = update.effective_user
+    if chat is None or user is None:
+        return False
+    if group_chat and chat.type in GROUP_TYPES and chat.id == group_id:
+        # The command can be executed in the group chat.
+        return True
+    if private_chat and chat.type == CHAT_PRIVATE and chat.id == user.id:
+        # The command can be executed in a private message with the bot.
+        return True
+    return False
 
 
 def is_member_status(
@@ -69,10 +272,10 @@ def is_member_status(
         member_status: str = CHATMEMBER_MEMBER
 ):
     if member_status in GROUP_MEMBERS.keys():
-        chat_member = get_chat_member(bot, user_id, group_id)
-        if chat_member:
-            if chat_member.status in GROUP_MEMBERS.keys():
-                return GROUP_MEMBERS[chat_member.status] >= GROUP_MEMBERS[member_status]
+        status = get_member_status(bot, user_id, group_id)
+        if status:
+            if status in GROUP_MEMBERS.keys():
+                return GROUP_MEMBERS[status] >= GROUP_MEMBERS[member_status]
             else:
                 logger.warn("Chat member status not in GROUP_MEMBERS.")
                 return False
@@ -103,9 +306,9 @@ def restricted_group_chat(func):
     """Restrict access to messages coming from a group chat the bot belongs to."""
     @wraps(func)
     def wrapped(update: Update, context: CallbackContext):
-        chat_id = update.effective_chat.id
+        chat = update.effective_chat
         user = update.effective_user
-        if is_group_chat(context.bot, chat_id):
+        if chat is not None and chat.type in GROUP_TYPES:
             return func(update, context)
         else:
             logger.warning(f"Unauthorized access: {func.__name__} - {user.id} - {user.username}.")
@@ -123,31 +326,14 @@ def restricted_group_member(
     def callable(func):
         @wraps(func)
         def wrapped(update: Update, context: CallbackContext):
-            chat_id = update.effective_chat.id
+            # The chat is checked locally from the update first, so commands
+            # issued in the wrong chat never reach the API.
+            if not is_allowed_chat(update, group_id, group_chat, private_chat):
+                return
             user = update.effective_user
-            bot = context.bot
-            if is_member_status(bot, user.id, group_id, member_status):
-                if group_chat and private_chat:
-                    # The command can be executed in the group or in a private message with the bot.
-                    if is_group(bot, chat_id, group_id) or chat_id == user.id:
-                        return func(update, context)
-                    else:
-                        return
-                elif group_chat:
-                    # The command can only be executed in the group chat.
-                    if is_group(bot, chat_id, group_id):
-                        return func(update, context)
-                    else:
-                        return
-                elif private_chat:
-                    # The command can only be exectued in a private message with the bot.
-                    if chat_id == user.id:
-                        return func(update, context)
-                    else:
-                        return
-                else:
-                    return
+            if is_member_status(context.bot, user.id, group_id, member_status):
+                return func(update, context)
             else:
                 return
         return wrapped
-    return callable
\ No newline at end of file
+    return callable
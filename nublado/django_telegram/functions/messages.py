@@ -0,0 +1,81 @@
+import datetime
+import logging
+
+from telegram import Bot
+from telegram.error import BadRequest, TelegramError
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import TmpMessage
+from ..outbound import PRIORITY_LOW, outbound_priority
+
+logger = logging.getLogger('django')
+
+TMP_MESSAGES = settings.DJANGO_TELEGRAM.get('tmp_messages', {})
+# Errors meaning the message is already gone.
+MESSAGE_GONE_ERRORS = (
+    "message to delete not found",
+    "message_id_invalid"
+)
+
+
+def delete_tmp_messages(bot: Bot, chat_id: int = None) -> dict:
+    """Delete saved tmp messages from their chats, in batches.
+
+    The rows of deleted messages are removed in bulk. Failed deletions are
+    kept to be retried at the next cleanup, until they are purged for being
+    too old or having failed too many times.
+    """
+    batch_size = TMP_MESSAGES.get('batch_size', 100)
+    # Telegram can't delete messages older than 48 hours.
+    max_age = TMP_MESSAGES.get('max_age', 48 * 3600)
+    max_attempts = TMP_MESSAGES.get('max_attempts', 3)
+
+    purged = TmpMessage.objects.purge(
+        timezone.now() - datetime.timedelta(seconds=max_age),
+        max_attempts
+    )
+    queryset = TmpMessage.objects.order_by('id')
+    if chat_id is not None:
+        queryset = queryset.filter(chat_id=chat_id)
+
+    deleted = failed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            queryset.filter(id__gt=last_id).values_list('id', 'chat_id', 'message_id')[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        deleted_ids = []
+        failed_ids = []
+        # Cleanup yields to interactive requests in the rate limiter.
+        with outbound_priority(PRIORITY_LOW):
+            for tmp_message_id, message_chat_id, message_id in batch:
+                try:
+                    bot.delete_message(
+                        chat_id=message_chat_id,
+                        message_id=message_id
+                    )
+                    deleted_ids.append(tmp_message_id)
+                except BadRequest as e:
+                    if e.message.lower() in MESSAGE_GONE_ERRORS:
+                        deleted_ids.append(tmp_message_id)
+                    else:
+                        logger.warning(f"Error deleting message {message_id} in {message_chat_id}: {e}")
+                        failed_ids.append(tmp_message_id)
+                except TelegramError as e:
+                    logger.warning(f"Error deleting message {message_id} in {message_chat_id}: {e}")
+                    failed_ids.append(tmp_message_id)
+        TmpMessage.objects.record_cleanup(deleted_ids, failed_ids)
+        deleted += len(deleted_ids)
+        failed += len(failed_ids)
+
+    logger.info(f"Tmp messages deleted: {deleted}, failed: {failed}, purged: {purged}")
+    return {
+        'deleted': deleted,
+        'failed': failed,
+        'purged': purged
+    }
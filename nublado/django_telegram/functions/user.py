@@ -1,5 +1,14 @@
+import threading
+
+from cachetools import TTLCache
 from telegram import User
 
+from ..models import TelegramGroupMember
+
+# Display names recently saved by this process, to skip redundant updates.
+_display_names = TTLCache(maxsize=1000, ttl=3600)
+_display_names_lock = threading.Lock()
+
 
 def get_username_or_name(user: User) -> str:
     """Return user's username or first and last names."""
@@ -9,3 +18,16 @@ def get_username_or_name(user: User) -> str:
         return f"{user.first_name} {user.last_name}"
     else:
         return user.first_name
+
+
+def save_display_name(group_id: int, user: User) -> bool:
+    """Save a group member's display name if it changed. Return whether it did."""
+    display_name = get_username_or_name(user)
+    key = (group_id, user.id)
+    with _display_names_lock:
+        if _display_names.get(key) == display_name:
+            return False
+    changed = TelegramGroupMember.objects.set_display_name(group_id, user.id, display_name) > 0
+    with _display_names_lock:
+        _display_names[key] = display_name
+    return changed
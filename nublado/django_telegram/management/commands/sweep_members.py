@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from ...apps import DjangoTelegramConfig
+from ...functions.admin import get_non_group_members
+
+
+class Command(BaseCommand):
+    help = "Check which stored members of a bot's group are no longer in it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('bot_id', type=str)
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help="Only check members not seen recently."
+        )
+
+    def handle(self, *args, **options):
+        bot_id = options['bot_id']
+        try:
+            bot_settings = settings.DJANGO_TELEGRAM['bots'][bot_id]
+            bot_token = bot_settings['token']
+            group_id = bot_settings['group_id']
+        except:
+            error = "Bot id {} doesn't exist or is improperly configured.".format(bot_id)
+            raise CommandError(error)
+
+        bot = DjangoTelegramConfig.bot_registry.get_bot(bot_token)
+        if not bot:
+            raise CommandError("Bot {} isn't registered.".format(bot_id))
+        sweep = get_non_group_members(
+            bot.telegram_bot,
+            group_id,
+            incremental=options['incremental']
+        )
+        if sweep is None:
+            raise CommandError("The group is already being swept.")
+        self.stdout.write(
+            "Checked {0} members: {1} left, {2} errors.".format(
+                sweep.checked,
+                sweep.left,
+                sweep.errors
+            )
+        )
@@ -1,10 +1,16 @@
 import logging
+from collections import namedtuple
 
 from django.contrib.auth.models import BaseUserManager
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 logger = logging.getLogger('django')
 
+MembersAdded = namedtuple('MembersAdded', ['inserted', 'existing'])
+
 
 class TelegramGroupMemberManager(BaseUserManager):
     def create_group_member(self, group_id=None, user_id=None, **kwargs):
@@ -30,6 +36,78 @@ class TelegramGroupMemberManager(BaseUserManager):
             **kwargs
         )
 
+    def set_display_name(self, group_id: int, user_id: int, display_name: str) -> int:
+        """Update a member's display name if it changed."""
+        return self.get_queryset().filter(
+            group_id=group_id,
+            user_id=user_id
+        ).exclude(
+            display_name=display_name
+        ).update(display_name=display_name, date_updated=timezone.now())
+
+    def add_members(self, group_id: int, user_ids: list) -> MembersAdded:
+        """Add users to a group's members in bulk, skipping existing members.
+
+        The members are inserted with a single statement, which doesn't send
+        post_save, and members_added is sent in the same transaction so
+        receivers can create dependent rows in bulk. Returns the user ids of
+        the inserted members and the number that already existed.
+        """
+        # Signals can't be imported by the managers module.
+        from .signals import members_added
+
+        user_ids = set(user_ids)
+        with transaction.atomic(using=self._db):
+            existing = set(
+                self.get_queryset().filter(
+                    group_id=group_id,
+                    user_id__in=user_ids
+                ).values_list('user_id', flat=True)
+            )
+            new_members = [
+                self.model(group_id=group_id, user_id=user_id)
+                for user_id in user_ids - existing
+            ]
+            inserted = []
+            if new_members:
+                self.bulk_create(new_members, ignore_conflicts=True)
+                # Members added concurrently keep their own ids.
+                inserted = list(
+                    self.get_queryset().filter(
+                        id__in=[member.id for member in new_members]
+                    ).values_list('user_id', flat=True)
+                )
+            if inserted:
+                members_added.send(
+                    sender=self.model,
+                    group_id=group_id,
+                    user_ids=inserted
+                )
+        return MembersAdded(
+            inserted=inserted,
+            existing=len(user_ids) - len(inserted)
+        )
+
+    def remove_members(self, group_id: int, user_ids: list) -> list:
+        """Remove users from a group's members in bulk. Return the removed user ids."""
+        # Signals can't be imported by the managers module.
+        from .signals import members_removed
+
+        with transaction.atomic(using=self._db):
+            queryset = self.get_queryset().filter(
+                group_id=group_id,
+                user_id__in=user_ids
+            )
+            removed = list(queryset.values_list('user_id', flat=True))
+            if removed:
+                queryset.delete()
+                members_removed.send(
+                    sender=self.model,
+                    group_id=group_id,
+                    user_ids=removed
+                )
+        return removed
+
 
 class TmpMessageManager(BaseUserManager):
     def create_tmp_message(self, message_id=None, chat_id=None, **kwargs):
@@ -56,4 +134,145 @@ class TmpMessageManager(BaseUserManager):
         )
 
     def get_queryset(self):
-        return super(TmpMessageManager, self).get_queryset()
\ No newline at end of file
+        return super(TmpMessageManager, self).get_queryset()
+
+    def record_cleanup(self, deleted_ids: list, failed_ids: list) -> None:
+        """Remove the rows of deleted messages and count an attempt for the failed ones."""
+        if deleted_ids:
+            self.get_queryset().filter(id__in=deleted_ids).delete()
+        if failed_ids:
+            self.get_queryset().filter(id__in=failed_ids).update(
+                attempts=F('attempts') + 1
+            )
+
+    def purge(self, created_before, max_attempts: int) -> int:
+        """Delete the rows of messages too old or failing too often to be deleted."""
+        num_deleted, deleted_dict = self.get_queryset().filter(
+            Q(date_created__lt=created_before) | Q(attempts__gte=max_attempts)
+        ).delete()
+        return num_deleted
+
+
+class ProcessedUpdateManager(BaseUserManager):
+    def record_update(self, bot_id: int, update_id: int) -> bool:
+        """Record an update. Return False if it was already recorded."""
+        try:
+            with transaction.atomic(using=self._db):
+                self.create(bot_id=bot_id, update_id=update_id)
+            return True
+        except IntegrityError:
+            return False
+
+    def purge(self, bot_id: int, before_update_id: int) -> int:
+        """Delete the bot's recorded updates older than an update id."""
+        num_deleted, deleted_dict = self.get_queryset().filter(
+            bot_id=bot_id,
+            update_id__lt=before_update_id
+        ).delete()
+        return num_deleted
+
+
+class RateLimitBucketManager(BaseUserManager):
+    def get_buckets_for_update(self, keys: list) -> dict:
+        """Lock the buckets with the given keys, creating missing ones.
+
+        Must be called inside a transaction.
+        """
+        qs = self.get_queryset().select_for_update().filter(key__in=keys)
+        buckets = {bucket.key: bucket for bucket in qs}
+        if len(buckets) < len(keys):
+            self.bulk_create(
+                [self.model(key=key) for key in keys if key not in buckets],
+                ignore_conflicts=True
+            )
+            buckets = {bucket.key: bucket for bucket in qs.all()}
+        return buckets
+
+
+class MembershipSweepManager(BaseUserManager):
+    def start_sweep(self, group_id: int, seen_before=None):
+        """Return the group's interrupted sweep to resume it, or a new sweep."""
+        sweep = self.get_queryset().filter(
+            group_id=group_id,
+            status=self.model.STATUS_RUNNING
+        ).order_by('-date_created').first()
+        if sweep is None:
+            sweep = self.create(
+                group_id=group_id,
+                seen_before=seen_before
+            )
+        return sweep
+
+    def get_latest(self, group_id: int):
+        """Return the group's last completed sweep, or None."""
+        return self.get_queryset().filter(
+            group_id=group_id,
+            status=self.model.STATUS_COMPLETED
+        ).order_by('-date_completed').first()
+
+    def record_batch(self, sweep, checks: list, date_seen) -> None:
+        """Save the results of a batch of checks and advance the sweep's checkpoint.
+
+        `checks` is a list of (user_id, result, detail) tuples, in order of user id.
+        """
+        # Models can't be imported by the managers module.
+        from .models import MembershipCheck, TelegramGroupMember
+
+        seen_user_ids = [
+            user_id for user_id, result, detail in checks
+            if result == MembershipCheck.RESULT_MEMBER
+        ]
+        results = [result for user_id, result, detail in checks]
+        sweep.last_user_id = checks[-1][0]
+        sweep.checked = F('checked') + len(checks)
+        sweep.left = F('left') + results.count(MembershipCheck.RESULT_LEFT)
+        sweep.errors = F('errors') + results.count(MembershipCheck.RESULT_ERROR)
+        with transaction.atomic(using=self._db):
+            MembershipCheck.objects.bulk_create(
+                [
+                    MembershipCheck(
+                        sweep=sweep,
+                        user_id=user_id,
+                        result=result,
+                        detail=detail[:255]
+                    )
+                    for user_id, result, detail in checks
+                ],
+                ignore_conflicts=True
+            )
+            if seen_user_ids:
+                TelegramGroupMember.objects.filter(
+                    group_id=sweep.group_id,
+                    user_id__in=seen_user_ids
+                ).update(date_last_seen=date_seen, date_updated=date_seen)
+            sweep.save(update_fields=['last_user_id', 'checked', 'left', 'errors', 'date_updated'])
+        sweep.refresh_from_db(fields=['checked', 'left', 'errors'])
+
+    def complete(self, sweep, date_completed) -> None:
+        sweep.status = self.model.STATUS_COMPLETED
+        sweep.date_completed = date_completed
+        sweep.save(update_fields=['status', 'date_completed', 'date_updated'])
+
+    def purge(self, group_id: int, keep: int) -> int:
+        """Delete the group's completed sweeps except the last `keep`."""
+        keep_ids = self.get_queryset().filter(
+            group_id=group_id,
+            status=self.model.STATUS_COMPLETED
+        ).order_by('-date_completed').values_list('id', flat=True)[:keep]
+        num_deleted, deleted_dict = self.get_queryset().filter(
+            group_id=group_id,
+            status=self.model.STATUS_COMPLETED
+        ).exclude(id__in=list(keep_ids)).delete()
+        return num_deleted
+
+
+class MembershipCheckManager(BaseUserManager):
+    def get_page(self, sweep_id, result: str, page: int = 1, page_size: int = 20) -> list:
+        """Return a page of a sweep's checks with a result, in order of user id."""
+        offset = (max(page, 1) - 1) * page_size
+        return list(
+            self.get_queryset().filter(
+                sweep_id=sweep_id,
+                result=result
+            ).order_by('user_id')[offset:offset + page_size]
+        )
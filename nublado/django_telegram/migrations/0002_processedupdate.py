@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-18 07:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='date updated')),
+                ('bot_id', models.BigIntegerField()),
+                ('update_id', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'processed update',
+                'verbose_name_plural': 'processed updates',
+                'unique_together': {('bot_id', 'update_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-18 08:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram', '0002_processedupdate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='date updated')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('tokens', models.FloatField(default=0)),
+                ('stamp', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name': 'rate limit bucket',
+                'verbose_name_plural': 'rate limit buckets',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram', '0003_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tmpmessage',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
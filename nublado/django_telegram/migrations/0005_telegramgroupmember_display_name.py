@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram', '0004_tmpmessage_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramgroupmember',
+            name='display_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.0 on 2026-10-18 08:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram', '0005_telegramgroupmember_display_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='date updated')),
+                ('group_id', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('running', 'running'), ('completed', 'completed')], default='running', max_length=16)),
+                ('seen_before', models.DateTimeField(blank=True, null=True)),
+                ('last_user_id', models.PositiveBigIntegerField(default=0)),
+                ('checked', models.PositiveIntegerField(default=0)),
+                ('left', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('date_completed', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'membership sweep',
+                'verbose_name_plural': 'membership sweeps',
+            },
+        ),
+        migrations.AddField(
+            model_name='telegramgroupmember',
+            name='date_last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MembershipCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveBigIntegerField()),
+                ('result', models.CharField(choices=[('member', 'member'), ('left', 'left'), ('error', 'error')], max_length=16)),
+                ('detail', models.CharField(blank=True, default='', max_length=255)),
+                ('sweep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checks', to='django_telegram.membershipsweep')),
+            ],
+            options={
+                'verbose_name': 'membership check',
+                'verbose_name_plural': 'membership checks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='membershipcheck',
+            index=models.Index(fields=['sweep', 'result', 'user_id'], name='membership_check_result_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='membershipcheck',
+            unique_together={('sweep', 'user_id')},
+        ),
+    ]
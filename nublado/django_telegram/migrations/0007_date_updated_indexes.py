@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram', '0006_membershipsweep'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telegramgroupmember',
+            index=models.Index(fields=['date_updated'], name='group_member_updated_idx'),
+        ),
+    ]
@@ -3,6 +3,10 @@ from django.utils.translation import gettext_lazy as _
 
 from core.models import TimestampModel, UUIDModel
 from .managers import (
+    MembershipCheckManager,
+    MembershipSweepManager,
+    ProcessedUpdateManager,
+    RateLimitBucketManager,
     TelegramGroupMemberManager,
     TmpMessageManager
 )
@@ -11,6 +15,18 @@ from .managers import (
 class TelegramGroupMember(TimestampModel, UUIDModel):
     user_id = models.PositiveBigIntegerField()
     group_id = models.BigIntegerField()
+    # Last known username or name, so member lists can be shown without
+    # requesting each member from Telegram.
+    display_name = models.CharField(
+        max_length=255,
+        blank=True,
+        default=""
+    )
+    # Last time a membership sweep found the user in the group.
+    date_last_seen = models.DateTimeField(
+        null=True,
+        blank=True
+    )
 
     objects = TelegramGroupMemberManager()
 
@@ -18,6 +34,13 @@ class TelegramGroupMember(TimestampModel, UUIDModel):
         verbose_name = _("Telegram group member")
         verbose_name_plural = _("Telegram group members")
         unique_together = ('user_id', 'group_id')
+        indexes = [
+            # For incremental snapshot exports.
+            models.Index(
+                fields=['date_updated'],
+                name='group_member_updated_idx'
+            )
+        ]
 
     def __str__(self):
         return "group: {0}, user: {1}".format(
@@ -29,6 +52,10 @@ class TelegramGroupMember(TimestampModel, UUIDModel):
 class TmpMessage(TimestampModel):
     message_id = models.BigIntegerField()
     chat_id = models.BigIntegerField()
+    # Failed attempts to delete the message.
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
 
     objects = TmpMessageManager()
 
@@ -38,4 +65,150 @@ class TmpMessage(TimestampModel):
         unique_together = ('message_id', 'chat_id')
 
     def __str__(self):
-        return "message_id: {}".format(self.message_id)
\ No newline at end of file
+        return "message_id: {}".format(self.message_id)
+
+
+class ProcessedUpdate(TimestampModel):
+    """An update received by a bot, kept to detect redelivered updates."""
+    bot_id = models.BigIntegerField()
+    update_id = models.BigIntegerField()
+
+    objects = ProcessedUpdateManager()
+
+    class Meta:
+        verbose_name = _("processed update")
+        verbose_name_plural = _("processed updates")
+        unique_together = ('bot_id', 'update_id')
+
+    def __str__(self):
+        return "bot: {0}, update_id: {1}".format(
+            self.bot_id,
+            self.update_id
+        )
+
+
+class RateLimitBucket(TimestampModel):
+    """The state of a token bucket of the outbound rate limiter."""
+    key = models.CharField(
+        max_length=255,
+        unique=True
+    )
+    tokens = models.FloatField(
+        default=0
+    )
+    # Time of the last update, or a future time the bucket is blocked until.
+    stamp = models.FloatField(
+        null=True
+    )
+
+    objects = RateLimitBucketManager()
+
+    class Meta:
+        verbose_name = _("rate limit bucket")
+        verbose_name_plural = _("rate limit buckets")
+
+    def __str__(self):
+        return "key: {0}, tokens: {1}".format(
+            self.key,
+            self.tokens
+        )
+
+
+class MembershipSweep(TimestampModel):
+    """A check of whether the stored members of a group are still in it."""
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_CHOICES = (
+        (STATUS_RUNNING, _("running")),
+        (STATUS_COMPLETED, _("completed"))
+    )
+
+    group_id = models.BigIntegerField()
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=STATUS_RUNNING
+    )
+    # Only members not seen since this time are checked.
+    seen_before = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    # Members are checked in order of user id. An interrupted sweep resumes
+    # after the last one checked.
+    last_user_id = models.PositiveBigIntegerField(
+        default=0
+    )
+    checked = models.PositiveIntegerField(
+        default=0
+    )
+    left = models.PositiveIntegerField(
+        default=0
+    )
+    errors = models.PositiveIntegerField(
+        default=0
+    )
+    date_completed = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    objects = MembershipSweepManager()
+
+    class Meta:
+        verbose_name = _("membership sweep")
+        verbose_name_plural = _("membership sweeps")
+
+    def __str__(self):
+        return "group: {0}, status: {1}".format(
+            self.group_id,
+            self.status
+        )
+
+
+class MembershipCheck(models.Model):
+    """The result of checking a member in a membership sweep."""
+    RESULT_MEMBER = "member"
+    RESULT_LEFT = "left"
+    RESULT_ERROR = "error"
+    RESULT_CHOICES = (
+        (RESULT_MEMBER, _("member")),
+        (RESULT_LEFT, _("left")),
+        (RESULT_ERROR, _("error"))
+    )
+
+    sweep = models.ForeignKey(
+        MembershipSweep,
+        on_delete=models.CASCADE,
+        related_name='checks'
+    )
+    user_id = models.PositiveBigIntegerField()
+    result = models.CharField(
+        max_length=16,
+        choices=RESULT_CHOICES
+    )
+    # The member status, or the error of a failed check.
+    detail = models.CharField(
+        max_length=255,
+        blank=True,
+        default=""
+    )
+
+    objects = MembershipCheckManager()
+
+    class Meta:
+        verbose_name = _("membership check")
+        verbose_name_plural = _("membership checks")
+        unique_together = ('sweep', 'user_id')
+        indexes = [
+            models.Index(
+                fields=['sweep', 'result', 'user_id'],
+                name='membership_check_result_idx'
+            )
+        ]
+
+    def __str__(self):
+        return "user: {0}, result: {1}".format(
+            self.user_id,
+            self.result
+        )
@@ -0,0 +1,399 @@
+import fcntl
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot as TelegramBot
+from telegram.utils.helpers import DEFAULT_NONE
+
+from django.db import transaction
+
+logger = logging.getLogger('django')
+
+RATE_LIMIT_BACKEND_LOCAL = "local"
+RATE_LIMIT_BACKEND_FILE = "file"
+RATE_LIMIT_BACKEND_DATABASE = "database"
+
+# Priority classes. Lower priorities can't use the share of a bucket reserved
+# for higher ones, so moderation isn't starved by chatter.
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+PRIORITY_RESERVES = {
+    PRIORITY_HIGH: 0.0,
+    PRIORITY_NORMAL: 0.2,
+    PRIORITY_LOW: 0.5
+}
+ENDPOINT_PRIORITIES = {
+    'restrictChatMember': PRIORITY_HIGH,
+    'banChatMember': PRIORITY_HIGH,
+    'unbanChatMember': PRIORITY_HIGH,
+    'deleteMessage': PRIORITY_HIGH,
+    'pinChatMessage': PRIORITY_HIGH,
+    'unpinChatMessage': PRIORITY_HIGH,
+    'sendChatAction': PRIORITY_LOW
+}
+# Endpoints counted against Telegram's flood limits.
+LIMITED_ENDPOINT_PREFIXES = (
+    'send', 'copy', 'forward', 'edit', 'delete', 'pin', 'unpin',
+    'restrict', 'ban', 'unban'
+)
+# Endpoints that can be answered in the webhook response. Their result is
+# replaced with True, which the Bot methods return as is.
+REPLY_IN_RESPONSE_ENDPOINTS = ('sendMessage', 'editMessageText', 'deleteMessage')
+GLOBAL_BUCKET_KEY = "global"
+# Bucket states untouched for this long are full and can be dropped.
+BUCKET_EXPIRY = 3600
+# Seconds global tokens leased by a process from the database stay usable.
+LEASE_TTL = 1
+
+_local = threading.local()
+
+
+@contextmanager
+def outbound_priority(priority: str):
+    """Send the requests made in this thread with a priority class."""
+    previous = getattr(_local, 'priority', None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class ReplyCapture(object):
+    """The webhook reply of an update, possibly captured in another thread than the webhook request's."""
+    def __init__(self):
+        self.eligible = False
+        self.reply = None
+        self.abandoned = False
+        # Set when the update has been processed.
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def claim(self, reply: dict) -> bool:
+        """Keep a request as the reply, unless there is one or the webhook request gave up."""
+        with self.lock:
+            if self.abandoned or self.reply is not None:
+                return False
+            self.reply = reply
+            return True
+
+    def release(self) -> None:
+        with self.lock:
+            self.reply = None
+
+    def abandon(self) -> bool:
+        """Stop waiting for a reply. Return False if one was already claimed."""
+        with self.lock:
+            if self.reply is not None:
+                return False
+            self.abandoned = True
+            return True
+
+
+@contextmanager
+def capture_reply(capture: ReplyCapture = None):
+    """Capture the first eligible request made in this thread as a webhook reply."""
+    if capture is None:
+        capture = ReplyCapture()
+    previous = getattr(_local, 'capture', None)
+    _local.capture = capture
+    try:
+        yield capture
+    finally:
+        _local.capture = previous
+
+
+@contextmanager
+def reply_eligible(eligible: bool = True):
+    """Make the requests in this block eligible (or not) to be captured as a webhook reply."""
+    capture = getattr(_local, 'capture', None)
+    if capture is None:
+        yield
+        return
+    previous = capture.eligible
+    capture.eligible = eligible
+    try:
+        yield
+    finally:
+        capture.eligible = previous
+
+
+def take_tokens(states: dict, buckets: list, now: float, counts: dict = None):
+    """Take a token from each bucket if all of them have one available.
+
+    `states` maps bucket keys to (tokens, stamp) pairs, where a stamp in the
+    future means the bucket is blocked until then, with a single token left
+    for the request that was held back. `buckets` is a list of
+    (key, rate, capacity, reserve) tuples. `counts` maps the keys of buckets
+    to take more than one token from to their number of tokens.
+
+    Returns the new states and 0, or the unchanged states and the seconds to
+    wait until the tokens are available.
+    """
+    new_states = {}
+    wait = 0
+    for key, rate, capacity, reserve in buckets:
+        count = (counts or {}).get(key, 1)
+        tokens, stamp = states.get(key) or (capacity, now)
+        if stamp > now:
+            wait = max(wait, stamp - now)
+            continue
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        # The reserve is capped at the capacity, so a single token can always be
+        # taken, but more tokens than the capacity can't.
+        needed = max(count, min(capacity, count + reserve * capacity))
+        if tokens < needed:
+            wait = max(wait, (needed - tokens) / rate)
+        new_states[key] = (tokens - count, now)
+    if wait > 0:
+        return states, wait
+    return new_states, 0
+
+
+class LocalBucketBackend(object):
+    """Token buckets shared by the threads of a process."""
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, buckets: list) -> float:
+        with self.lock:
+            states, wait = take_tokens(self.states, buckets, time.time())
+            if not wait:
+                self.states.update(states)
+            return wait
+
+    def block(self, key: str, seconds: float) -> None:
+        with self.lock:
+            self.states[key] = (1, time.time() + seconds)
+
+
+class FileBucketBackend(object):
+    """Token buckets in a locked file, shared by the processes of a host."""
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def locked_states(self):
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                states = json.loads(content) if content else {}
+                yield states
+                now = time.time()
+                states = {
+                    key: state for key, state in states.items()
+                    if state[1] > now - BUCKET_EXPIRY
+                }
+                f.seek(0)
+                f.truncate()
+                json.dump(states, f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, buckets: list) -> float:
+        with self.locked_states() as states:
+            new_states, wait = take_tokens(states, buckets, time.time())
+            if not wait:
+                states.update(new_states)
+            return wait
+
+    def block(self, key: str, seconds: float) -> None:
+        with self.locked_states() as states:
+            states[key] = (1, time.time() + seconds)
+
+
+class DatabaseBucketBackend(object):
+    """Token buckets in the database, shared by every process.
+
+    Every request takes the lock of the global bucket's row, so each process
+    leases up to `lease_size` global tokens at a time and spends them locally
+    for `LEASE_TTL` seconds. Requests to chats still lock their chat's row.
+    """
+    def __init__(self, lease_size: int = 5):
+        # Models can't be imported while bot.py is loaded by the app config.
+        from .models import RateLimitBucket
+        self.model = RateLimitBucket
+        self.lease_size = lease_size
+        self.leased = 0
+        self.lease_expires = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, buckets: list) -> float:
+        now = time.time()
+        with self.lock:
+            leased = self.leased > 0 and self.lease_expires > now
+            if leased:
+                self.leased -= 1
+        if leased:
+            buckets = [bucket for bucket in buckets if bucket[0] != GLOBAL_BUCKET_KEY]
+            if not buckets:
+                return 0
+
+        lease = 0
+        with transaction.atomic():
+            rows = self.model.objects.get_buckets_for_update(
+                [key for key, rate, capacity, reserve in buckets]
+            )
+            states = {key: (row.tokens, row.stamp) for key, row in rows.items() if row.stamp}
+            new_states, wait = take_tokens(states, buckets, now)
+            if not wait and not leased and self.lease_size > 1:
+                # Lease the tokens of the next requests too, if available.
+                lease_states, lease_wait = take_tokens(
+                    states, buckets, now, counts={GLOBAL_BUCKET_KEY: self.lease_size}
+                )
+                if not lease_wait:
+                    new_states = lease_states
+                    lease = self.lease_size - 1
+            if not wait:
+                for key, (tokens, stamp) in new_states.items():
+                    rows[key].tokens = tokens
+                    rows[key].stamp = stamp
+                self.model.objects.bulk_update(rows.values(), ['tokens', 'stamp'])
+
+        with self.lock:
+            if wait and leased:
+                # The leased token wasn't spent.
+                self.leased += 1
+            elif lease:
+                self.leased += lease
+                self.lease_expires = now + LEASE_TTL
+        return wait
+
+    def block(self, key: str, seconds: float) -> None:
+        if key == GLOBAL_BUCKET_KEY:
+            with self.lock:
+                self.leased = 0
+        with transaction.atomic():
+            rows = self.model.objects.get_buckets_for_update([key])
+            rows[key].tokens = 1
+            rows[key].stamp = time.time() + seconds
+            rows[key].save()
+
+
+class OutboundRateLimiter(object):
+    """Throttle requests to Telegram's global and per chat flood limits."""
+    def __init__(
+        self,
+        backend,
+        global_rate: float = 30,
+        global_burst: int = 30,
+        private_chat_rate: float = 1,
+        private_chat_burst: int = 3,
+        group_chat_rate: float = 20 / 60,
+        group_chat_burst: int = 20,
+        max_retries: int = 3
+    ):
+        self.backend = backend
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.private_chat_rate = private_chat_rate
+        self.private_chat_burst = private_chat_burst
+        self.group_chat_rate = group_chat_rate
+        self.group_chat_burst = group_chat_burst
+        self.max_retries = max_retries
+
+    def get_buckets(self, chat_id, priority: str) -> list:
+        reserve = PRIORITY_RESERVES.get(priority, 0.0)
+        buckets = [(GLOBAL_BUCKET_KEY, self.global_rate, self.global_burst, reserve)]
+        if chat_id is not None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                rate, burst = self.private_chat_rate, self.private_chat_burst
+            else:
+                rate, burst = self.group_chat_rate, self.group_chat_burst
+            buckets.append((f"chat:{chat_id}", rate, burst, reserve))
+        return buckets
+
+    def wait(self, chat_id=None, priority: str = PRIORITY_NORMAL) -> None:
+        """Block until a request to a chat may be sent."""
+        buckets = self.get_buckets(chat_id, priority)
+        while True:
+            wait = self.backend.acquire(buckets)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self, chat_id=None, priority: str = PRIORITY_NORMAL) -> bool:
+        """Take the tokens for a request to a chat if available, without waiting."""
+        return not self.backend.acquire(self.get_buckets(chat_id, priority))
+
+    def back_off(self, chat_id, seconds: float) -> None:
+        """Hold back requests to a chat (or all requests) after a flood error."""
+        key = f"chat:{chat_id}" if chat_id is not None else GLOBAL_BUCKET_KEY
+        self.backend.block(key, seconds)
+
+
+def get_rate_limiter(rate_limit_settings: dict = None):
+    """Return an outbound rate limiter, or None if disabled."""
+    if not rate_limit_settings:
+        return None
+    rate_limit_settings = dict(rate_limit_settings)
+    backend = rate_limit_settings.pop('backend', RATE_LIMIT_BACKEND_LOCAL)
+    file_path = rate_limit_settings.pop('file_path', None)
+    lease_size = rate_limit_settings.pop('lease_size', 5)
+    if backend == RATE_LIMIT_BACKEND_DATABASE:
+        bucket_backend = DatabaseBucketBackend(lease_size)
+    elif backend == RATE_LIMIT_BACKEND_FILE:
+        bucket_backend = FileBucketBackend(file_path)
+    else:
+        bucket_backend = LocalBucketBackend()
+    return OutboundRateLimiter(bucket_backend, **rate_limit_settings)
+
+
+class OutboundBot(TelegramBot):
+    """An ExtBot that sends its requests through an outbound rate limiter."""
+    def __init__(self, *args, rate_limiter: OutboundRateLimiter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def _get_reply(self, endpoint: str, data: dict, timeout, api_kwargs: dict):
+        """Return a request as a webhook reply, or None if it can't be serialized."""
+        data = dict(data or {})
+        data.update(api_kwargs or {})
+        self._insert_defaults(data, timeout)
+        reply = {key: value for key, value in data.items() if value is not None}
+        reply['method'] = endpoint
+        try:
+            json.dumps(reply)
+        except TypeError:
+            return None
+        return reply
+
+    def _post(self, endpoint: str, data: dict = None, timeout=DEFAULT_NONE, api_kwargs: dict = None):
+        limited = self.rate_limiter is not None and endpoint.startswith(LIMITED_ENDPOINT_PREFIXES)
+        chat_id = (data or {}).get('chat_id') or (api_kwargs or {}).get('chat_id')
+        priority = getattr(_local, 'priority', None) or \
+            ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_NORMAL)
+
+        capture = getattr(_local, 'capture', None)
+        if capture is not None and capture.eligible and capture.reply is None \
+                and endpoint in REPLY_IN_RESPONSE_ENDPOINTS:
+            reply = self._get_reply(endpoint, data, timeout, api_kwargs)
+            if reply is not None and capture.claim(reply):
+                # Replies count against the flood limits too. If no token is
+                # available, the request is sent (and waits) as usual instead.
+                if not limited or self.rate_limiter.try_acquire(chat_id, priority):
+                    return True
+                capture.release()
+
+        if not limited:
+            return super()._post(endpoint, data=data, timeout=timeout, api_kwargs=api_kwargs)
+
+        retries = 0
+        while True:
+            self.rate_limiter.wait(chat_id, priority)
+            try:
+                return super()._post(endpoint, data=data, timeout=timeout, api_kwargs=api_kwargs)
+            except RetryAfter as e:
+                retries += 1
+                logger.warning(f"Flood limit reached sending {endpoint} to {chat_id}. Retrying in {e.retry_after}s.")
+                self.rate_limiter.back_off(chat_id, e.retry_after)
+                if retries > self.rate_limiter.max_retries:
+                    raise
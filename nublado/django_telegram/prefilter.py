@@ -0,0 +1,156 @@
+import logging
+import re
+import threading
+from collections import Counter
+
+from telegram.constants import (
+    UPDATE_ALL_TYPES, UPDATE_CALLBACK_QUERY, UPDATE_CHAT_JOIN_REQUEST,
+    UPDATE_CHAT_MEMBER, UPDATE_CHOSEN_INLINE_RESULT, UPDATE_INLINE_QUERY,
+    UPDATE_MESSAGE, UPDATE_MY_CHAT_MEMBER, UPDATE_POLL, UPDATE_POLL_ANSWER,
+    UPDATE_PRE_CHECKOUT_QUERY, UPDATE_SHIPPING_QUERY
+)
+from telegram.ext import (
+    CallbackQueryHandler, ChatJoinRequestHandler, ChatMemberHandler,
+    ChosenInlineResultHandler, CommandHandler, InlineQueryHandler,
+    MessageHandler, PollAnswerHandler, PollHandler, PrefixHandler,
+    PreCheckoutQueryHandler, ShippingQueryHandler
+)
+from telegram.ext.filters import Filters, MergedFilter
+
+logger = logging.getLogger('django')
+
+COMMAND_PREFIX = '/'
+# Update types consumed by each kind of handler. Message and command handlers
+# only consume new messages: edited messages would trigger them a second time.
+HANDLER_UPDATE_TYPES = [
+    (MessageHandler, [UPDATE_MESSAGE]),
+    (CommandHandler, [UPDATE_MESSAGE]),
+    (CallbackQueryHandler, [UPDATE_CALLBACK_QUERY]),
+    (InlineQueryHandler, [UPDATE_INLINE_QUERY]),
+    (ChosenInlineResultHandler, [UPDATE_CHOSEN_INLINE_RESULT]),
+    (ShippingQueryHandler, [UPDATE_SHIPPING_QUERY]),
+    (PreCheckoutQueryHandler, [UPDATE_PRE_CHECKOUT_QUERY]),
+    (PollHandler, [UPDATE_POLL]),
+    (PollAnswerHandler, [UPDATE_POLL_ANSWER]),
+    (ChatJoinRequestHandler, [UPDATE_CHAT_JOIN_REQUEST]),
+]
+CHAT_MEMBER_UPDATE_TYPES = {
+    ChatMemberHandler.MY_CHAT_MEMBER: [UPDATE_MY_CHAT_MEMBER],
+    ChatMemberHandler.CHAT_MEMBER: [UPDATE_CHAT_MEMBER],
+    ChatMemberHandler.ANY_CHAT_MEMBER: [UPDATE_MY_CHAT_MEMBER, UPDATE_CHAT_MEMBER]
+}
+# A regex anchored to a single literal character, e.g. ^[+] or ^#
+REGEX_PREFIX_REGEX = re.compile(r'^\^(?:\[(\\\W|[^\]\\^])\]|(\\\W|[^\\.\[(|?*+{$^]))(?![?*{])')
+
+
+def get_handler_update_types(handler):
+    """Return the update types a handler can consume, or None for any type."""
+    if isinstance(handler, ChatMemberHandler):
+        return CHAT_MEMBER_UPDATE_TYPES.get(handler.chat_member_types)
+    for handler_class, update_types in HANDLER_UPDATE_TYPES:
+        if isinstance(handler, handler_class):
+            return update_types
+    return None
+
+
+def get_regex_prefix(pattern: str):
+    """Return the literal character a regex pattern must start with, if any."""
+    match = REGEX_PREFIX_REGEX.match(pattern)
+    if match and '|' not in pattern:
+        prefix = match.group(1) or match.group(2)
+        return prefix.lstrip('\\')
+    return None
+
+
+def get_filter_text_prefixes(message_filter):
+    """Return the prefixes of the message texts a filter can match.
+
+    An empty tuple means the filter matches no text messages and None means
+    the filter can match any text.
+    """
+    if isinstance(message_filter, MergedFilter):
+        base_prefixes = get_filter_text_prefixes(message_filter.base_filter)
+        if message_filter.and_filter is not None:
+            and_prefixes = get_filter_text_prefixes(message_filter.and_filter)
+            return base_prefixes if base_prefixes is not None else and_prefixes
+        if message_filter.or_filter is not None:
+            or_prefixes = get_filter_text_prefixes(message_filter.or_filter)
+            if base_prefixes is None or or_prefixes is None:
+                return None
+            return base_prefixes + or_prefixes
+        return base_prefixes
+    if isinstance(message_filter, Filters.regex):
+        if message_filter.pattern.flags & re.IGNORECASE:
+            return None
+        prefix = get_regex_prefix(message_filter.pattern.pattern)
+        return (prefix,) if prefix else None
+    if (message_filter.name or '').startswith('Filters.status_update'):
+        # Service messages have no text.
+        return ()
+    return None
+
+
+def get_handler_text_prefixes(handler):
+    """Return the prefixes of the message texts a handler can consume, or None for any text."""
+    if isinstance(handler, PrefixHandler):
+        return None
+    if isinstance(handler, CommandHandler):
+        return (COMMAND_PREFIX,)
+    if isinstance(handler, MessageHandler):
+        return get_filter_text_prefixes(handler.filters)
+    return ()
+
+
+class UpdatePrefilter(object):
+    """Drop raw updates that no registered handler can consume."""
+    def __init__(self):
+        self.update_types = None
+        self.text_prefixes = None
+        self.dropped = Counter()
+        self.lock = threading.Lock()
+
+    def refresh(self, handlers) -> None:
+        """Derive the consumable update types and text prefixes from (handler, update_types) pairs."""
+        update_types = set()
+        text_prefixes = set()
+        for handler, handler_update_types in handlers:
+            if handler_update_types is None:
+                handler_update_types = get_handler_update_types(handler)
+            if handler_update_types is None:
+                update_types = None
+                text_prefixes = None
+                break
+            update_types.update(handler_update_types)
+            if text_prefixes is not None and UPDATE_MESSAGE in handler_update_types:
+                prefixes = get_handler_text_prefixes(handler)
+                if prefixes is None:
+                    text_prefixes = None
+                else:
+                    text_prefixes.update(prefixes)
+        self.update_types = update_types
+        self.text_prefixes = tuple(text_prefixes) if text_prefixes is not None else None
+
+    def allowed_updates(self) -> list:
+        """Return the update types to request from Telegram."""
+        if self.update_types is None:
+            return UPDATE_ALL_TYPES
+        return [update_type for update_type in UPDATE_ALL_TYPES if update_type in self.update_types]
+
+    def accepts(self, data: dict) -> bool:
+        update_type = next((key for key in data if key != 'update_id'), None)
+        if self.update_types is not None and update_type not in self.update_types:
+            self._drop(update_type)
+            return False
+        if update_type == UPDATE_MESSAGE and self.text_prefixes is not None:
+            text = data[update_type].get('text')
+            if text is not None and not text.startswith(self.text_prefixes):
+                self._drop('message_text')
+                return False
+        return True
+
+    def _drop(self, reason: str) -> None:
+        with self.lock:
+            self.dropped[reason] += 1
+
+    def stats(self) -> dict:
+        return dict(self.dropped)
@@ -1,13 +1,26 @@
-from django.conf import settings
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db import transaction
+from django.dispatch import Signal, receiver
 
-from .models import TelegramGroupMember
-from group_points.models import GroupMemberPoints
+from .functions.group import member_sampler
 
+# Sent by the bulk member methods, which don't send post_save or post_delete,
+# with the group_id and user_ids of the members. Receivers run inside the
+# transaction that added or removed the members.
+members_added = Signal()
+members_removed = Signal()
 
-@receiver(post_save, sender=TelegramGroupMember)
-def create_group_member_points(sender, instance=None, created=False, **kwargs):
-    if created:
-        group_member_points = GroupMemberPoints(group_member=instance)
-        group_member_points.save()
\ No newline at end of file
+
+@receiver(members_added)
+def add_sampled_group_members(sender, group_id=None, user_ids=None, **kwargs):
+    def add_members():
+        for user_id in user_ids:
+            member_sampler.add(group_id, user_id)
+    transaction.on_commit(add_members)
+
+
+@receiver(members_removed)
+def remove_sampled_group_members(sender, group_id=None, user_ids=None, **kwargs):
+    def remove_members():
+        for user_id in user_ids:
+            member_sampler.remove(group_id, user_id)
+    transaction.on_commit(remove_members)
@@ -0,0 +1,216 @@
+import time
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase
+
+from .bot import Bot
+from .dedup import DatabaseUpdateDedupWindow, UpdateDedupWindow
+from .models import ProcessedUpdate, RateLimitBucket
+from .outbound import GLOBAL_BUCKET_KEY, DatabaseBucketBackend, take_tokens
+from .workers import UpdateScheduler
+
+
+class AcceptAll(object):
+    def accepts(self, data: dict) -> bool:
+        return True
+
+
+def get_test_bot(dedup) -> Bot:
+    """Return a bot receiving updates without Telegram, the dispatcher or a scheduler."""
+    bot = Bot.__new__(Bot)
+    bot.prefilter = AcceptAll()
+    bot.scheduler = None
+    bot.dedup = dedup
+    bot.webhook_reply = False
+    bot.telegram_bot = SimpleNamespace(username='test_bot')
+    bot.processed = []
+    bot.process_update = lambda data, reply_in_response=False: bot.processed.append(data.get('update_id'))
+    return bot
+
+
+class UpdateDedupWindowTests(SimpleTestCase):
+    def test_duplicate(self):
+        window = UpdateDedupWindow(size=10)
+        self.assertFalse(window.is_duplicate(1))
+        self.assertTrue(window.is_duplicate(1))
+        self.assertEqual(window.stats(), {'size': 1, 'hits': 1, 'misses': 1})
+
+    def test_window_size(self):
+        window = UpdateDedupWindow(size=2)
+        for update_id in (1, 2, 3):
+            window.is_duplicate(update_id)
+        self.assertFalse(window.is_duplicate(1))
+        self.assertTrue(window.is_duplicate(3))
+
+    def test_release(self):
+        window = UpdateDedupWindow(size=10)
+        window.is_duplicate(1)
+        window.release(1)
+        self.assertFalse(window.is_duplicate(1))
+
+    def test_missing_update_id(self):
+        window = UpdateDedupWindow(size=10)
+        self.assertFalse(window.is_duplicate(None))
+        self.assertFalse(window.is_duplicate(None))
+
+
+class DatabaseUpdateDedupWindowTests(TestCase):
+    def test_duplicate_across_processes(self):
+        DatabaseUpdateDedupWindow(1, size=10).is_duplicate(5)
+        self.assertTrue(DatabaseUpdateDedupWindow(1, size=10).is_duplicate(5))
+        self.assertFalse(DatabaseUpdateDedupWindow(2, size=10).is_duplicate(5))
+
+    def test_release(self):
+        window = DatabaseUpdateDedupWindow(1, size=10)
+        window.is_duplicate(5)
+        window.release(5)
+        self.assertFalse(ProcessedUpdate.objects.filter(bot_id=1, update_id=5).exists())
+        self.assertFalse(DatabaseUpdateDedupWindow(1, size=10).is_duplicate(5))
+
+    def test_purge_per_recorded_updates(self):
+        window = DatabaseUpdateDedupWindow(1, size=10)
+        # Only odd ids are recorded, so purging can't depend on the ids' values.
+        for update_id in range(1, 40, 2):
+            window.is_duplicate(update_id)
+        self.assertLess(ProcessedUpdate.objects.filter(bot_id=1).count(), 20)
+        self.assertFalse(ProcessedUpdate.objects.filter(bot_id=1, update_id__lt=39 - 10).exists())
+
+    def test_missing_update_id(self):
+        window = DatabaseUpdateDedupWindow(1, size=10)
+        self.assertFalse(window.is_duplicate(None))
+        self.assertFalse(window.is_duplicate(None))
+        self.assertFalse(ProcessedUpdate.objects.exists())
+
+
+class ReceiveUpdateTests(TestCase):
+    def test_redelivery_skipped(self):
+        bot = get_test_bot(UpdateDedupWindow(size=10))
+        bot.receive_update({'update_id': 1})
+        bot.receive_update({'update_id': 1})
+        self.assertEqual(bot.processed, [1])
+
+    def test_redelivery_after_error_processed(self):
+        bot = get_test_bot(DatabaseUpdateDedupWindow(1, size=10))
+        process_update = bot.process_update
+
+        def fail(data, reply_in_response=False):
+            raise RuntimeError()
+        bot.process_update = fail
+        with self.assertRaises(RuntimeError):
+            bot.receive_update({'update_id': 1})
+        bot.process_update = process_update
+        bot.receive_update({'update_id': 1})
+        self.assertEqual(bot.processed, [1])
+
+    def test_redelivery_after_full_queue_processed(self):
+        bot = get_test_bot(UpdateDedupWindow(size=10))
+
+        class FullScheduler(object):
+            def submit(self, data: dict, capture=None) -> bool:
+                return False
+        bot.scheduler = FullScheduler()
+        self.assertIsNone(bot.receive_update({'update_id': 1}))
+        bot.scheduler = None
+        bot.receive_update({'update_id': 1})
+        self.assertEqual(bot.processed, [1])
+
+    def test_update_without_id_processed(self):
+        bot = get_test_bot(UpdateDedupWindow(size=10))
+        bot.receive_update({})
+        bot.receive_update({})
+        self.assertEqual(len(bot.processed), 2)
+
+
+class TakeTokensTests(SimpleTestCase):
+    buckets = [(GLOBAL_BUCKET_KEY, 1, 2, 0.0), ("chat:1", 1, 1, 0.0)]
+
+    def test_take_from_every_bucket(self):
+        states, wait = take_tokens({}, self.buckets, 100)
+        self.assertEqual(wait, 0)
+        self.assertEqual(states, {GLOBAL_BUCKET_KEY: (1, 100), "chat:1": (0, 100)})
+
+    def test_wait_for_empty_bucket(self):
+        states = {GLOBAL_BUCKET_KEY: (2, 100), "chat:1": (0, 100)}
+        new_states, wait = take_tokens(states, self.buckets, 100.25)
+        self.assertEqual(new_states, states)
+        self.assertAlmostEqual(wait, 0.75)
+
+    def test_refill(self):
+        states, wait = take_tokens({GLOBAL_BUCKET_KEY: (0, 100)}, self.buckets[:1], 101.5)
+        self.assertEqual(wait, 0)
+        self.assertAlmostEqual(states[GLOBAL_BUCKET_KEY][0], 0.5)
+
+    def test_reserve(self):
+        buckets = [(GLOBAL_BUCKET_KEY, 1, 10, 0.5)]
+        states, wait = take_tokens({GLOBAL_BUCKET_KEY: (5, 100)}, buckets, 100)
+        self.assertAlmostEqual(wait, 1)
+        states, wait = take_tokens({GLOBAL_BUCKET_KEY: (6, 100)}, buckets, 100)
+        self.assertEqual(wait, 0)
+
+    def test_blocked_bucket(self):
+        states, wait = take_tokens({GLOBAL_BUCKET_KEY: (1, 110)}, self.buckets[:1], 100)
+        self.assertEqual(wait, 10)
+
+    def test_counts(self):
+        states, wait = take_tokens({}, self.buckets, 100, counts={GLOBAL_BUCKET_KEY: 2})
+        self.assertEqual(states[GLOBAL_BUCKET_KEY], (0, 100))
+        states, wait = take_tokens({}, self.buckets, 100, counts={GLOBAL_BUCKET_KEY: 3})
+        self.assertGreater(wait, 0)
+
+
+class DatabaseBucketBackendTests(TestCase):
+    buckets = [(GLOBAL_BUCKET_KEY, 0.001, 30, 0.0)]
+
+    def test_lease(self):
+        backend = DatabaseBucketBackend(lease_size=5)
+        self.assertEqual(backend.acquire(self.buckets), 0)
+        self.assertAlmostEqual(RateLimitBucket.objects.get(key=GLOBAL_BUCKET_KEY).tokens, 25, places=2)
+        with self.assertNumQueries(0):
+            for i in range(4):
+                self.assertEqual(backend.acquire(self.buckets), 0)
+        backend.acquire(self.buckets)
+        self.assertAlmostEqual(RateLimitBucket.objects.get(key=GLOBAL_BUCKET_KEY).tokens, 20, places=2)
+
+    def test_lease_with_chat_bucket(self):
+        backend = DatabaseBucketBackend(lease_size=5)
+        buckets = self.buckets + [("chat:1", 0.001, 1, 0.0)]
+        self.assertEqual(backend.acquire(buckets), 0)
+        # The chat's bucket is empty, so the leased global token isn't spent.
+        self.assertGreater(backend.acquire(buckets), 0)
+        self.assertEqual(backend.leased, 4)
+
+    def test_block_drops_lease(self):
+        backend = DatabaseBucketBackend(lease_size=5)
+        backend.acquire(self.buckets)
+        backend.block(GLOBAL_BUCKET_KEY, 10)
+        self.assertGreater(backend.acquire(self.buckets), 0)
+
+
+class QueuedReplyTests(SimpleTestCase):
+    reply = {'method': 'sendMessage', 'chat_id': 1, 'text': "Hi"}
+
+    def get_bot(self, delay: float):
+        bot = get_test_bot(None)
+        bot.webhook_reply = True
+        bot.webhook_reply_timeout = 0.2
+        bot.claimed = []
+
+        def process_update(data, capture=None):
+            time.sleep(delay)
+            bot.claimed.append(capture.claim(dict(self.reply)))
+            capture.done.set()
+        bot.scheduler = UpdateScheduler(process_update, num_lanes=1, drain_timeout=1)
+        self.addCleanup(bot.scheduler.stop)
+        return bot
+
+    def test_reply_from_lane(self):
+        bot = self.get_bot(0)
+        self.assertEqual(bot.receive_update({'update_id': 1}), self.reply)
+        self.assertEqual(bot.claimed, [True])
+
+    def test_slow_lane_sends_reply(self):
+        bot = self.get_bot(0.4)
+        self.assertEqual(bot.receive_update({'update_id': 1}), {})
+        bot.scheduler.stop()
+        # The handler sends its message itself.
+        self.assertEqual(bot.claimed, [False])
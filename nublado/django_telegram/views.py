@@ -1,10 +1,7 @@
 import json
 import logging
 
-from telegram import Update
-from telegram.error import TelegramError
-
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views import View
 
 from .apps import DjangoTelegramConfig
@@ -27,19 +24,16 @@ class BotWebhookView(View):
                 )
                 raise Http404
 
-            try:
-                update = Update.de_json(data, bot.telegram_bot)
-                bot.dispatcher.process_update(update)
-                logger.debug("Bot <{}> : Processed update {}".format(
+            reply = bot.receive_update(data)
+            if reply is not None:
+                # The reply, if any, is a request for Telegram to carry out.
+                return JsonResponse(reply)
+            else:
+                # Telegram retries the delivery later.
+                logger.warn("Bot <{}> : Update queue is full. {}".format(
                     bot.telegram_bot.username,
-                    update
+                    bot.scheduler.stats() if bot.scheduler else ""
                 ))
-            except TelegramError as te:
-                logger.warn("Bot <{}> : Error was raised while processing Update.".format(
-                    bot.telegram_bot.username
-                ))
-                bot.dispatcher.dispatch_error(update, te)
-
-            return JsonResponse({})
+                return HttpResponse(status=503)
         else:
             raise Http404
@@ -0,0 +1,153 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger('django')
+
+
+def get_update_chat_id(data: dict):
+    """Return the id of the chat (or user) an update belongs to from its raw data."""
+    for key, value in data.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        chat = value.get('chat')
+        if chat is None and isinstance(value.get('message'), dict):
+            # Callback queries
+            chat = value['message'].get('chat')
+        if chat is not None:
+            return chat.get('id')
+        # Inline queries, poll answers and other updates without a chat
+        user = value.get('from') or value.get('user')
+        if user is not None:
+            return user.get('id')
+    return None
+
+
+class UpdateLane(object):
+    """An ordered queue of updates processed by a single thread."""
+    def __init__(self, index: int, queue_size: int):
+        self.index = index
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self) -> dict:
+        return {
+            'lane': self.index,
+            'depth': self.queue.qsize(),
+            'processed': self.processed,
+            'avg_wait': self.total_wait / self.processed if self.processed else 0.0,
+            'max_wait': self.max_wait
+        }
+
+
+class UpdateScheduler(object):
+    """Dispatch queued updates on ordered lanes of background threads.
+
+    Updates are sharded onto lanes by chat id, so updates from the same chat
+    are processed in the order they were received while different chats are
+    processed in parallel.
+
+    Threads are started lazily on the first submitted update so that they are
+    created in the process that serves requests (e.g., after gunicorn forks).
+    """
+    def __init__(
+        self,
+        process_update,
+        num_lanes: int = 4,
+        queue_size: int = 100,
+        drain_timeout: float = 10
+    ):
+        self.process_update = process_update
+        self.drain_timeout = drain_timeout
+        lane_queue_size = max(queue_size // num_lanes, 1)
+        self.lanes = [UpdateLane(i, lane_queue_size) for i in range(num_lanes)]
+        self.running = False
+        self.stopped = False
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.running or self.stopped:
+                return
+            for lane in self.lanes:
+                lane.thread = threading.Thread(
+                    target=self._work,
+                    args=(lane,),
+                    name=f"update_lane_{lane.index}",
+                    daemon=True
+                )
+                lane.thread.start()
+            self.running = True
+            atexit.register(self.stop)
+
+    def get_lane(self, data: dict) -> UpdateLane:
+        chat_id = get_update_chat_id(data)
+        if chat_id is None:
+            return self.lanes[0]
+        return self.lanes[hash(chat_id) % len(self.lanes)]
+
+    def submit(self, data: dict, capture=None) -> bool:
+        """Queue an update. Return False if its lane is full or the scheduler is stopped.
+
+        A reply capture is passed on to process_update with the update.
+        """
+        if not self.running:
+            self.start()
+        if self.stopped:
+            return False
+        try:
+            self.get_lane(data).queue.put_nowait((data, time.monotonic(), capture))
+            return True
+        except queue.Full:
+            return False
+
+    def stats(self) -> list:
+        """Return the depth and wait times of each lane."""
+        return [lane.stats() for lane in self.lanes]
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop accepting updates and wait for the queued ones to be processed."""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            self.stopped = True
+
+        timeout = self.drain_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        logger.info(f"Draining queued updates: {self.stats()}")
+        # Sentinels are queued behind any pending updates.
+        for lane in self.lanes:
+            try:
+                lane.queue.put(None, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                pass
+        for lane in self.lanes:
+            lane.thread.join(max(deadline - time.monotonic(), 0))
+        if any(lane.thread.is_alive() for lane in self.lanes):
+            logger.warning(f"Update lanes stopped before draining: {self.stats()}")
+
+    def _work(self, lane: UpdateLane) -> None:
+        while True:
+            item = lane.queue.get()
+            if item is None:
+                return
+            data, enqueued_at, capture = item
+            wait = time.monotonic() - enqueued_at
+            lane.processed += 1
+            lane.total_wait += wait
+            lane.max_wait = max(lane.max_wait, wait)
+            try:
+                self.process_update(data, capture=capture)
+            except Exception:
+                logger.exception("Error processing queued update.")
+            finally:
+                # Threads outside the request cycle have to clean up their own connections.
+                close_old_connections()
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+from django.conf import settings
+
+from django_telegram.outbound import reply_eligible
+
+logger = logging.getLogger('django')
+
+ANNOUNCEMENTS = getattr(settings, 'GROUP_POINTS', {}).get('announcements', {})
+
+
+class ChatAnnouncement(object):
+    def __init__(self, message_id: int, expires: float, lines: list):
+        self.message_id = message_id
+        self.expires = expires
+        self.lines = lines
+
+
+class PointsAnnouncer(object):
+    """Coalesce point announcements in a chat into a single message.
+
+    Announcements made within `window` seconds of the first one are added to
+    its message by editing it, up to `max_lines`. After that a new message is
+    sent.
+    """
+    def __init__(self, window: float = 60, max_lines: int = 10):
+        self.window = window
+        self.max_lines = max_lines
+        self.announcements = {}
+        self.lock = threading.Lock()
+        self.chat_locks = {}
+        self.sent = 0
+        self.edited = 0
+
+    def _get_chat_lock(self, chat_id: int) -> threading.Lock:
+        with self.lock:
+            return self.chat_locks.setdefault(chat_id, threading.Lock())
+
+    def announce(self, bot: Bot, chat_id: int, text: str) -> None:
+        with self._get_chat_lock(chat_id):
+            now = time.monotonic()
+            announcement = self.announcements.get(chat_id)
+            if announcement and now < announcement.expires and len(announcement.lines) < self.max_lines:
+                lines = announcement.lines + [text]
+                try:
+                    # Sent right away, not as the webhook reply, so a failed
+                    # edit falls back to a new message.
+                    with reply_eligible(False):
+                        bot.edit_message_text(
+                            "\n".join(lines),
+                            chat_id=chat_id,
+                            message_id=announcement.message_id
+                        )
+                    announcement.lines = lines
+                    self.edited += 1
+                    return
+                except TelegramError as e:
+                    # The message may have been deleted.
+                    logger.info(f"Error editing points announcement in {chat_id}: {e}")
+
+            # The id of the new message is needed, so it can't be the webhook reply.
+            with reply_eligible(False):
+                message = bot.send_message(
+                    chat_id=chat_id,
+                    text=text
+                )
+            self.announcements[chat_id] = ChatAnnouncement(
+                message.message_id,
+                now + self.window,
+                [text]
+            )
+            self.sent += 1
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'edited': self.edited
+        }
+
+
+points_announcer = PointsAnnouncer(
+    window=ANNOUNCEMENTS.get('window', 60),
+    max_lines=ANNOUNCEMENTS.get('max_lines', 10)
+)
+
+
+def announce_points(bot: Bot, chat_id: int, text: str) -> None:
+    """Announce a point change in a chat, coalesced with recent announcements if enabled."""
+    if ANNOUNCEMENTS.get('enabled', True):
+        points_announcer.announce(bot, chat_id, text)
+    else:
+        bot.send_message(
+            chat_id=chat_id,
+            text=text
+        )
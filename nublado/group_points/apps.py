@@ -2,3 +2,6 @@ from django.apps import AppConfig
 
 class GroupPointsConfig(AppConfig):
     name = "group_points"
+
+    def ready(self):
+        from . import signals
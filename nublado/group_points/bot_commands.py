@@ -8,15 +8,22 @@ from telegram.ext import (
 from django.conf import settings
 from django.utils.translation import gettext as _
 
-from django_telegram.functions.user import get_username_or_name
-from django_telegram.functions.group import (
-    get_chat_member
-)
+from django_telegram.functions.user import get_username_or_name, save_display_name
 from django_telegram.models import TelegramGroupMember
 from language_days.functions import (
     set_language_day_locale,
 )
+from .announcements import announce_points
+from .leaderboard import (
+    get_period_bucket,
+    invalidate_leaderboard,
+    points_changed,
+    render_leaderboard,
+    render_period_leaderboard
+)
 from .models import GroupMemberPoints
+from .rank_index import rank_indexes
+from .write_behind import get_pending_delta, transfer_points
 
 logger = logging.getLogger('django')
 
@@ -26,7 +33,6 @@ REMOVE_POINTS_CHAR = '-'
 REMOVE_POINTS_REGEX = '^[' + REMOVE_POINTS_CHAR + '][\s\S]*$'
 POINT_NAME = _("raindrop")
 POINTS_NAME = _("raindrops")
-TOP_POINTS_LIMIT = 10
 
 # Translated messages
 msg_no_give_points_bot = _("You can't give {points_name} to a bot.")
@@ -49,54 +55,79 @@ msg_take_point = _(
     "*{sender_name} ({sender_points})* has taken a " + \
     "{points_name} from *{receiver_name} ({receiver_points})*."
 )
+msg_no_rank = _("You don't have any {points_name} yet.")
+msg_member_rank = _(
+    "*{name}* is ranked {rank} of {total}, " + \
+    "ahead of {percentile}% of the group.\n{neighbours}"
+)
 
 
 def get_group_member_points(user_id, group_id):
-    """Get user's total points in group."""
-    group_member, group_member_created = TelegramGroupMember.objects.get_or_create(
-        group_id=group_id,
-        user_id=user_id
-    )
-    member_points, member_points_created = GroupMemberPoints.objects.get_or_create(
-        group_member_id=group_member.id
-    )
+    """Get user's total points in group, including buffered transfers."""
+    member_points = GroupMemberPoints.objects.get_member_points(group_id, user_id)
+    member_points.points = max(member_points.points + get_pending_delta(group_id, user_id), 0)
     return member_points
 
 
 def group_top_points(update: Update, context: CallbackContext, group_id: int = None) -> None:
     if group_id:
-        member_points = GroupMemberPoints.objects.get_group_top_points(
-            group_id, TOP_POINTS_LIMIT
-        )
-
-        if member_points:
-            top_points = []
-
-            for member in member_points:
-                points = member.points
-                user_id = member.group_member.user_id
-                chat_member = get_chat_member(context, user_id, GROUP_ID)
-
-                if chat_member:
-                    user = chat_member.user
-                    logger.info(user)
-                    name = get_username_or_name(user)
-                    name_points = "*{points}: {name}*".format(
-                        name=name,
-                        points=points
-                    )
-                    top_points.append(name_points)
-
-            message = _("*Top {point_name} rankings*\n{rankings_list}").format(
-                point_name=_(POINT_NAME),
-                rankings_list="\n".join(top_points)
-            )
+        set_language_day_locale()
+        period_bucket = get_period_bucket(context.args[0].lower()) if context.args else None
+        if period_bucket:
+            # e.g., /top week, /top month or /top en
+            message = render_period_leaderboard(group_id, *period_bucket, _(POINT_NAME))
+        else:
+            message = render_leaderboard(context.bot, group_id, _(POINT_NAME))
+        if message:
             context.bot.send_message(
                 chat_id=group_id,
                 text=message
             )
 
 
+def member_rank(update: Update, context: CallbackContext, group_id: int = None) -> None:
+    """Display a member's rank and the members right above and below."""
+    if group_id:
+        set_language_day_locale()
+        user = update.effective_user
+        rank_index = rank_indexes.get(group_id)
+        neighbours = rank_index.neighbours(user.id)
+
+        if neighbours:
+            display_names = dict(
+                TelegramGroupMember.objects.filter(
+                    group_id=group_id,
+                    user_id__in=[user_id for rank, user_id, points in neighbours]
+                ).values_list('user_id', 'display_name')
+            )
+            neighbour_lines = []
+            for rank, user_id, points in neighbours:
+                line = "{rank}. {name} ({points})".format(
+                    rank=rank,
+                    name=display_names.get(user_id) or user_id,
+                    points=points
+                )
+                if user_id == user.id:
+                    line = "*{}*".format(line)
+                neighbour_lines.append(line)
+            message = _(msg_member_rank).format(
+                name=get_username_or_name(user),
+                rank=rank_index.rank(user.id),
+                total=rank_index.total(),
+                percentile=round(rank_index.percentile(user.id)),
+                neighbours="\n".join(neighbour_lines)
+            )
+        else:
+            message = _(msg_no_rank).format(
+                points_name=_(POINTS_NAME)
+            )
+
+        context.bot.send_message(
+            chat_id=group_id,
+            text=message
+        )
+
+
 def add_points(update: Update, context: CallbackContext, group_id: int = None) -> None:
     if group_id:
         # Check if the message is a reply to another message.
@@ -109,27 +140,44 @@ def add_points(update: Update, context: CallbackContext, group_id: int = None) -
 
             # Check if the reply is to another member and not a bot or oneself.
             if not receiver.is_bot and sender != receiver:
-                sender_points = get_group_member_points(sender.id, group_id)
-                receiver_points = get_group_member_points(receiver.id, group_id)
-                receiver_points.points += sender_points.point_increment
-                receiver_points.save()
+                transfer = transfer_points(
+                    group_id,
+                    sender.id,
+                    receiver.id,
+                    source_chat_id=update.effective_chat.id,
+                    source_message_id=update.effective_message.message_id
+                )
+                if transfer.duplicate:
+                    return
+                renamed = [
+                    save_display_name(group_id, sender),
+                    save_display_name(group_id, receiver)
+                ]
+                if any(renamed):
+                    invalidate_leaderboard(group_id)
+                else:
+                    points_changed(group_id, receiver.id, transfer.receiver_points)
+                rank_indexes.update(group_id, sender.id, transfer.sender_points)
+                rank_indexes.update(group_id, receiver.id, transfer.receiver_points)
 
-                if sender_points.point_increment > 1:
+                if transfer.point_increment > 1:
                     message = _(msg_give_points).format(
                         sender_name=sender_name,
-                        sender_points=sender_points.points,
+                        sender_points=transfer.sender_points,
                         points_name=_(POINTS_NAME),
                         receiver_name=receiver_name,
-                        receiver_points=receiver_points.points
+                        receiver_points=transfer.receiver_points
                     )
                 else:
                     message = _(msg_give_point).format(
                         sender_name=sender_name,
-                        sender_points=sender_points.points,
+                        sender_points=transfer.sender_points,
                         points_name=_(POINT_NAME),
                         receiver_name=receiver_name,
-                        receiver_points=receiver_points.points
+                        receiver_points=transfer.receiver_points
                     )
+                announce_points(context.bot, group_id, message)
+                return
             elif receiver.is_bot:
                 message = _(msg_no_give_points_bot).format(
                     points_name=_(POINTS_NAME)
@@ -155,28 +203,45 @@ def remove_points(update: Update, context: CallbackContext, group_id: int = None
             receiver_name = get_username_or_name(receiver)
 
             if not receiver.is_bot and sender != receiver:
-                sender_points = get_group_member_points(sender.id, group_id)
-                receiver_points = get_group_member_points(receiver.id, group_id)
-                points = receiver_points.points - sender_points.point_increment
-                receiver_points.points = points if points >= 0 else 0
-                receiver_points.save()
+                transfer = transfer_points(
+                    group_id,
+                    sender.id,
+                    receiver.id,
+                    remove=True,
+                    source_chat_id=update.effective_chat.id,
+                    source_message_id=update.effective_message.message_id
+                )
+                if transfer.duplicate:
+                    return
+                renamed = [
+                    save_display_name(group_id, sender),
+                    save_display_name(group_id, receiver)
+                ]
+                if any(renamed):
+                    invalidate_leaderboard(group_id)
+                else:
+                    points_changed(group_id, receiver.id, transfer.receiver_points)
+                rank_indexes.update(group_id, sender.id, transfer.sender_points)
+                rank_indexes.update(group_id, receiver.id, transfer.receiver_points)
 
-                if sender_points.point_increment > 1:
+                if transfer.point_increment > 1:
                     message = _(msg_take_points).format(
                         sender_name=sender_name,
-                        sender_points=sender_points.points,
+                        sender_points=transfer.sender_points,
                         points_name=_(POINTS_NAME),
                         receiver_name=receiver_name,
-                        receiver_points=receiver_points.points
+                        receiver_points=transfer.receiver_points
                     )
                 else:
                     message = _(msg_take_point).format(
                         sender_name=sender_name,
-                        sender_points=sender_points.points,
+                        sender_points=transfer.sender_points,
                         points_name=_(POINT_NAME),
                         receiver_name=receiver_name,
-                        receiver_points=receiver_points.points
+                        receiver_points=transfer.receiver_points
                     )
+                announce_points(context.bot, group_id, message)
+                return
             elif receiver.is_bot:
                 message = _(msg_no_take_points_bot).format(
                     points_name=_(POINTS_NAME)
@@ -0,0 +1,174 @@
+import logging
+
+from telegram import Bot
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import get_language, gettext as _
+
+from django_telegram.functions.group import get_chat_member
+from django_telegram.functions.user import get_username_or_name
+from django_telegram.models import TelegramGroupMember
+from .models import GroupMemberPoints, PointsRollup, PointTransaction
+
+logger = logging.getLogger('django')
+
+TOP_POINTS_LIMIT = 10
+# Rendered leaderboards are also invalidated on point changes that alter the
+# top, so the timeout only bounds how long a renamed member shows the old name.
+LEADERBOARD_CACHE_TIMEOUT = 3600
+LEADERBOARD_CACHE_KEY = "group_points:leaderboard:{group_id}:{language}"
+TOP_MEMBERS_CACHE_KEY = "group_points:top:{group_id}"
+
+
+def get_leaderboard_cache_keys(group_id: int) -> list:
+    keys = [
+        LEADERBOARD_CACHE_KEY.format(group_id=group_id, language=language)
+        for language, name in settings.LANGUAGES
+    ]
+    keys.append(TOP_MEMBERS_CACHE_KEY.format(group_id=group_id))
+    return keys
+
+
+def invalidate_leaderboard(group_id: int) -> None:
+    cache.delete_many(get_leaderboard_cache_keys(group_id))
+
+
+def points_changed(group_id: int, user_id: int, points: int) -> None:
+    """Invalidate a group's leaderboard if a member's new points alter its top."""
+    top_members = cache.get(TOP_MEMBERS_CACHE_KEY.format(group_id=group_id))
+    if top_members is None:
+        # Nothing cached, or the rendered texts may have outlived the top.
+        invalidate_leaderboard(group_id)
+        return
+    top_points = dict(top_members)
+    if user_id in top_points:
+        altered = top_points[user_id] != points
+    elif len(top_members) < TOP_POINTS_LIMIT:
+        altered = points > 0
+    else:
+        altered = points >= top_members[-1][1]
+    if altered:
+        invalidate_leaderboard(group_id)
+
+
+def get_display_names(bot: Bot, group_id: int, member_points: list) -> dict:
+    """Return the display names of members, requesting the unknown ones from Telegram once."""
+    display_names = {}
+    for points in member_points:
+        group_member = points.group_member
+        if not group_member.display_name:
+            chat_member = get_chat_member(bot, group_member.user_id, group_id)
+            if chat_member is None:
+                continue
+            group_member.display_name = get_username_or_name(chat_member.user)
+            TelegramGroupMember.objects.set_display_name(
+                group_id,
+                group_member.user_id,
+                group_member.display_name
+            )
+        display_names[group_member.user_id] = group_member.display_name
+    return display_names
+
+
+def get_top_points(group_id: int) -> list:
+    """Return the points rows of a group's top members, including buffered transfers."""
+    # The write-behind buffer invalidates leaderboards, so it's imported here.
+    from .write_behind import get_pending_deltas
+
+    pending = get_pending_deltas(group_id)
+    # Members without pending transfers that make the top are within this limit.
+    member_points = list(
+        GroupMemberPoints.objects.get_group_top_points(group_id, TOP_POINTS_LIMIT + len(pending))
+    )
+    if not pending:
+        return member_points
+    listed = set(points.group_member.user_id for points in member_points)
+    member_points += list(
+        GroupMemberPoints.objects.select_related('group_member').filter(
+            group_id=group_id,
+            group_member__user_id__in=[user_id for user_id in pending if user_id not in listed]
+        )
+    )
+    for points in member_points:
+        points.points = max(points.points + pending.get(points.group_member.user_id, 0), 0)
+    member_points = [points for points in member_points if points.points > 0]
+    member_points.sort(key=lambda points: -points.points)
+    return member_points[:TOP_POINTS_LIMIT]
+
+
+def render_leaderboard(bot: Bot, group_id: int, point_name: str):
+    """Return the leaderboard text of a group in the active language, or None if nobody has points.
+
+    The text is cached per group and language.
+    """
+    key = LEADERBOARD_CACHE_KEY.format(group_id=group_id, language=get_language())
+    message = cache.get(key)
+    if message is not None:
+        return message or None
+
+    member_points = get_top_points(group_id)
+    display_names = get_display_names(bot, group_id, member_points)
+    top_points = [
+        "*{points}: {name}*".format(
+            name=display_names[points.group_member.user_id],
+            points=points.points
+        )
+        for points in member_points
+        if points.group_member.user_id in display_names
+    ]
+    if top_points:
+        message = _("*Top {point_name} rankings*\n{rankings_list}").format(
+            point_name=point_name,
+            rankings_list="\n".join(top_points)
+        )
+    else:
+        message = ""
+
+    cache.set_many({
+        key: message,
+        TOP_MEMBERS_CACHE_KEY.format(group_id=group_id): [
+            (points.group_member.user_id, points.points) for points in member_points
+        ]
+    }, LEADERBOARD_CACHE_TIMEOUT)
+    return message or None
+
+
+def get_period_bucket(period: str):
+    """Return the rollup period and bucket for a /top argument, e.g. week or en, or None."""
+    if period in settings.LANGUAGE_DAYS:
+        return PointsRollup.PERIOD_LANGUAGE, period
+    for rollup_period, bucket in PointsRollup.objects.get_buckets(timezone.now()):
+        if rollup_period == period:
+            return rollup_period, bucket
+    return None
+
+
+def render_period_leaderboard(group_id: int, period: str, bucket: str, point_name: str):
+    """Return the leaderboard text of a group for a rollup period, or None if nobody has points."""
+    # Transfers are added to the rollups when they're read, instead of by each transfer.
+    PointTransaction.objects.roll_up_all()
+    top_points = list(
+        PointsRollup.objects.get_top_points(group_id, period, bucket, TOP_POINTS_LIMIT)
+    )
+    if not top_points:
+        return None
+    display_names = dict(
+        TelegramGroupMember.objects.filter(
+            group_id=group_id,
+            user_id__in=[user_id for user_id, points in top_points]
+        ).values_list('user_id', 'display_name')
+    )
+    rankings_list = [
+        "*{points}: {name}*".format(
+            name=display_names.get(user_id) or user_id,
+            points=points
+        )
+        for user_id, points in top_points
+    ]
+    return _("*Top {point_name} rankings ({bucket})*\n{rankings_list}").format(
+        point_name=point_name,
+        bucket=_(settings.LANGUAGE_DAYS[bucket]) if period == PointsRollup.PERIOD_LANGUAGE else bucket,
+        rankings_list="\n".join(rankings_list)
+    )
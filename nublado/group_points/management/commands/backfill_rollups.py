@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ...models import PointsRollup, PointTransaction
+
+
+class Command(BaseCommand):
+    help = "Rebuild the points rollups from the point transactions ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group-id', type=int)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rollups = PointsRollup.objects.all()
+        point_transactions = PointTransaction.objects.filter(compacted=True)
+        if options['group_id'] is not None:
+            rollups = rollups.filter(group_id=options['group_id'])
+            point_transactions = point_transactions.filter(group_id=options['group_id'])
+
+        # Transactions are marked to be rolled up again in the same transaction
+        # as the rollups are reset. The transactions are updated first, in the
+        # order roll_up locks them, so transactions a concurrent roll-up is
+        # adding wait for it and are rolled up again after the reset, once.
+        with transaction.atomic():
+            now = timezone.now()
+            point_transactions.update(rolled_up=False, date_updated=now)
+            rollups.update(points=0, date_updated=now)
+
+        total = PointTransaction.objects.roll_up_all(options['batch_size'])
+        self.stdout.write("Added {} point transactions to the rollups.".format(total))
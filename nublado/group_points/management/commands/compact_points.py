@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ...leaderboard import invalidate_leaderboard
+from ...models import PointTransaction
+
+
+class Command(BaseCommand):
+    help = "Roll uncompacted point transactions into the group member totals, then into the rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        group_ids = set(
+            PointTransaction.objects.filter(compacted=False).values_list('group_id', flat=True).distinct()
+        )
+        total = 0
+        while True:
+            compacted = PointTransaction.objects.compact(options['batch_size'])
+            if not compacted:
+                break
+            total += compacted
+        for group_id in group_ids:
+            invalidate_leaderboard(group_id)
+        rolled_up = PointTransaction.objects.roll_up_all(options['batch_size'])
+        self.stdout.write("Compacted {0} and rolled up {1} point transactions.".format(total, rolled_up))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...models import GroupMemberPoints
+
+
+class Command(BaseCommand):
+    help = "Create missing group member points rows and resync their group ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created, resynced = GroupMemberPoints.objects.repair(options['batch_size'])
+        self.stdout.write(
+            "Created {0} points rows, resynced {1} group ids.".format(created, resynced)
+        )
@@ -1,17 +1,389 @@
+import threading
+from collections import defaultdict, namedtuple
+
 from django.contrib.auth.models import BaseUserManager
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from cachetools import TTLCache
+
+from django_telegram.models import TelegramGroupMember
+from language_days.functions import get_language_day_date, get_weekday_languages
+
+PointsTransfer = namedtuple(
+    'PointsTransfer',
+    ['sender_points', 'receiver_points', 'point_increment', 'duplicate']
+)
+
 
 class GroupMemberPointsManager(BaseUserManager):
     def get_group_top_points(self, group_id, limit=10):
         qs = super().get_queryset()
         qs = qs.select_related('group_member')
         qs = qs.filter(
-            group_member__group_id=group_id,
+            group_id=group_id,
             points__gt=0
         )
         qs = qs.order_by('-points')
         return qs[:limit]
 
+    def get_member_points(self, group_id, user_id):
+        """Get a user's points in a group, creating the member if needed."""
+        group_member, group_member_created = TelegramGroupMember.objects.get_or_create(
+            group_id=group_id,
+            user_id=user_id
+        )
+        member_points, member_points_created = self.get_or_create(
+            group_member_id=group_member.id,
+            defaults={'group_id': group_id}
+        )
+        return member_points
+
+    def bulk_create_missing(self, group_id, user_ids) -> int:
+        """Create the missing points rows of a group's members in bulk."""
+        member_ids = list(
+            TelegramGroupMember.objects.filter(
+                group_id=group_id,
+                user_id__in=user_ids,
+                groupmemberpoints__isnull=True
+            ).values_list('id', flat=True)
+        )
+        if member_ids:
+            self.bulk_create(
+                [self.model(group_member_id=member_id, group_id=group_id) for member_id in member_ids],
+                ignore_conflicts=True
+            )
+        return len(member_ids)
+
+    def repair(self, batch_size: int = 1000) -> tuple:
+        """Create the missing points rows of all members in bulk and resync their group ids.
+
+        Returns the number of rows created and resynced.
+        """
+        created = 0
+        while True:
+            members = list(
+                TelegramGroupMember.objects.filter(
+                    groupmemberpoints__isnull=True
+                ).values_list('id', 'group_id')[:batch_size]
+            )
+            if not members:
+                break
+            self.bulk_create(
+                [self.model(group_member_id=member_id, group_id=group_id) for member_id, group_id in members],
+                ignore_conflicts=True
+            )
+            created += len(members)
+
+        resynced = self.get_queryset().exclude(
+            group_id=F('group_member__group_id')
+        ).update(
+            group_id=Subquery(
+                TelegramGroupMember.objects.filter(
+                    id=OuterRef('group_member_id')
+                ).values('group_id')[:1]
+            ),
+            date_updated=timezone.now()
+        )
+        return created, resynced
+
+    def transfer_points(
+        self,
+        group_id,
+        sender_id,
+        receiver_id,
+        remove=False,
+        source_chat_id=None,
+        source_message_id=None
+    ) -> PointsTransfer:
+        """Give the sender's point increment to the receiver, or take it with `remove`.
+
+        Once both members exist, a transfer takes three statements in one
+        transaction: a read of both members' points that locks them, so
+        concurrent transfers don't lose points, the receiver's update, clamped
+        at zero, and the ledger row with the change that was applied. Rollups
+        are added from the ledger by `PointTransactionManager.roll_up`. A
+        transfer from a source message that was already recorded isn't applied
+        again and is returned with `duplicate` set.
+        """
+        # Models can't be imported by the managers module.
+        from .models import PointTransaction
+
+        user_ids = [sender_id, receiver_id]
+        try:
+            with transaction.atomic(using=self._db):
+                totals = self._lock_totals(group_id, user_ids)
+                if len(totals) < len(set(user_ids)):
+                    self.get_totals(group_id, user_ids)
+                    totals = self._lock_totals(group_id, user_ids)
+                receiver_points, receiver_increment, group_member_id = totals[receiver_id]
+                point_increment = totals[sender_id][1]
+                delta = -point_increment if remove else point_increment
+                new_points = max(receiver_points + delta, 0)
+                self.get_queryset().filter(group_member_id=group_member_id).update(
+                    points=Greatest(F('points') + delta, Value(0)),
+                    date_updated=timezone.now()
+                )
+                PointTransaction.objects.create(
+                    group_id=group_id,
+                    giver_id=sender_id,
+                    receiver_id=receiver_id,
+                    delta=new_points - receiver_points,
+                    source_chat_id=source_chat_id,
+                    source_message_id=source_message_id,
+                    compacted=True
+                )
+        except IntegrityError:
+            if source_message_id is None or not PointTransaction.objects.filter(
+                source_chat_id=source_chat_id,
+                source_message_id=source_message_id
+            ).exists():
+                raise
+            totals = self.get_totals(group_id, user_ids)
+            return PointsTransfer(
+                sender_points=totals[sender_id][0],
+                receiver_points=totals[receiver_id][0],
+                point_increment=totals[sender_id][1],
+                duplicate=True
+            )
+
+        return PointsTransfer(
+            sender_points=new_points if sender_id == receiver_id else totals[sender_id][0],
+            receiver_points=new_points,
+            point_increment=point_increment,
+            duplicate=False
+        )
+
+    def apply_deltas(self, deltas: list) -> list:
+        """Add point deltas to members' totals in order, clamping each at zero.
+
+        `deltas` is a list of (group_id, user_id, delta) changes. Missing
+        members are created. Returns the deltas that were applied, in the
+        same order. Must be called inside a transaction.
+        """
+        keys = set((group_id, user_id) for group_id, user_id, delta in deltas)
+        member_ids = dict(
+            ((group_id, user_id), member_id)
+            for group_id, user_id, member_id in self._get_members(keys)
+        )
+        missing = defaultdict(list)
+        for group_id, user_id in keys:
+            if (group_id, user_id) not in member_ids:
+                missing[group_id].append(user_id)
+        if missing:
+            for group_id, user_ids in missing.items():
+                TelegramGroupMember.objects.add_members(group_id, user_ids)
+            member_ids = dict(
+                ((group_id, user_id), member_id)
+                for group_id, user_id, member_id in self._get_members(keys)
+            )
+
+        now = timezone.now()
+        member_points = dict(
+            (points.group_member_id, points)
+            for points in self.get_queryset().select_for_update().filter(
+                group_member_id__in=member_ids.values()
+            )
+        )
+        applied = []
+        for group_id, user_id, delta in deltas:
+            points = member_points[member_ids[(group_id, user_id)]]
+            total = max(points.points + delta, 0)
+            applied.append(total - points.points)
+            points.points = total
+            points.date_updated = now
+        self.bulk_update(member_points.values(), ['points', 'date_updated'])
+        return applied
+
+    def _lock_totals(self, group_id, user_ids) -> dict:
+        return {
+            user_id: (points, point_increment, group_member_id)
+            for user_id, points, point_increment, group_member_id in self.get_queryset().select_for_update(
+                of=('self',)
+            ).filter(
+                group_id=group_id,
+                group_member__user_id__in=user_ids
+            ).values_list('group_member__user_id', 'points', 'point_increment', 'group_member_id')
+        }
+
+    def _get_members(self, keys):
+        query = Q()
+        for group_id, user_id in keys:
+            query |= Q(group_id=group_id, user_id=user_id)
+        return TelegramGroupMember.objects.filter(query).values_list('group_id', 'user_id', 'id')
+
+    def get_totals(self, group_id, user_ids) -> dict:
+        """Return the (points, point_increment) of members, creating the missing ones."""
+        totals = {
+            user_id: (points, point_increment)
+            for user_id, points, point_increment in self.get_queryset().filter(
+                group_id=group_id,
+                group_member__user_id__in=user_ids
+            ).values_list('group_member__user_id', 'points', 'point_increment')
+        }
+        for user_id in user_ids:
+            if user_id not in totals:
+                member_points = self.get_member_points(group_id, user_id)
+                totals[user_id] = (member_points.points, member_points.point_increment)
+        return totals
+
+    def get_queryset(self):
+        return super(GroupMemberPointsManager, self).get_queryset()
+
+
+class PointTransactionManager(BaseUserManager):
+    def bulk_record(self, transactions: list) -> None:
+        """Record transactions in bulk, to be rolled into the totals by compaction.
+
+        Transactions from source messages, or with entry keys, that were
+        already recorded are ignored.
+        """
+        for point_transaction in transactions:
+            point_transaction.compacted = False
+        self.bulk_create(transactions, ignore_conflicts=True)
+
+    def compact(self, batch_size: int = 1000) -> int:
+        """Roll a batch of uncompacted transactions into the totals.
+
+        Returns the number of transactions compacted.
+        """
+        # Models can't be imported by the managers module.
+        from .models import GroupMemberPoints
+
+        with transaction.atomic(using=self._db):
+            batch = list(
+                self.get_queryset().select_for_update(skip_locked=True).filter(
+                    compacted=False
+                ).order_by('id').values_list(
+                    'id', 'group_id', 'receiver_id', 'delta'
+                )[:batch_size]
+            )
+            if not batch:
+                return 0
+            applied = GroupMemberPoints.objects.apply_deltas(
+                [(group_id, receiver_id, delta) for _, group_id, receiver_id, delta in batch]
+            )
+            # Transactions clamped at zero are recorded with the change that was applied.
+            clamped = defaultdict(list)
+            for (transaction_id, _, _, delta), applied_delta in zip(batch, applied):
+                if applied_delta != delta:
+                    clamped[applied_delta].append(transaction_id)
+            for applied_delta, transaction_ids in clamped.items():
+                self.get_queryset().filter(id__in=transaction_ids).update(delta=applied_delta)
+            self.get_queryset().filter(
+                id__in=[transaction_id for transaction_id, *values in batch]
+            ).update(compacted=True, date_updated=timezone.now())
+        return len(batch)
+
+    def roll_up(self, batch_size: int = 1000) -> int:
+        """Add a batch of compacted transactions that weren't rolled up yet to the rollups.
+
+        Returns the number of transactions rolled up.
+        """
+        # Models can't be imported by the managers module.
+        from .models import PointsRollup
+
+        with transaction.atomic(using=self._db):
+            batch = list(
+                self.get_queryset().select_for_update(skip_locked=True).filter(
+                    compacted=True,
+                    rolled_up=False
+                ).order_by('id').values_list(
+                    'id', 'group_id', 'receiver_id', 'delta', 'date_created'
+                )[:batch_size]
+            )
+            if not batch:
+                return 0
+            PointsRollup.objects.add_transactions(
+                [point_transaction[1:] for point_transaction in batch]
+            )
+            self.get_queryset().filter(
+                id__in=[transaction_id for transaction_id, *values in batch]
+            ).update(rolled_up=True, date_updated=timezone.now())
+        return len(batch)
+
+    def roll_up_all(self, batch_size: int = 1000) -> int:
+        """Roll up batches until no transactions are left. Returns the number rolled up."""
+        total = 0
+        while True:
+            rolled_up = self.roll_up(batch_size)
+            if not rolled_up:
+                return total
+            total += rolled_up
+
+    def get_queryset(self):
+        return super(PointTransactionManager, self).get_queryset()
+
+
+class PointsRollupManager(BaseUserManager):
+    def __init__(self):
+        super().__init__()
+        # Keys of rollup rows known to exist, so adding points takes one UPDATE.
+        self.known_keys = TTLCache(maxsize=10000, ttl=3600)
+        self.lock = threading.Lock()
+
+    def get_buckets(self, when) -> list:
+        """Return the (period, bucket) pairs a point change at a time is added to."""
+        date = get_language_day_date(when)
+        year, week, weekday = date.isocalendar()
+        buckets = [
+            (self.model.PERIOD_DAY, date.isoformat()),
+            (self.model.PERIOD_WEEK, "{0}-W{1:02d}".format(year, week)),
+            (self.model.PERIOD_MONTH, date.strftime('%Y-%m'))
+        ]
+        language = get_weekday_languages().get(date.weekday())
+        if language:
+            buckets.append((self.model.PERIOD_LANGUAGE, language))
+        return buckets
+
+    def add_transactions(self, transactions) -> None:
+        """Add (group_id, user_id, delta, date_created) point changes to their rollups."""
+        sums = defaultdict(int)
+        for group_id, user_id, delta, date_created in transactions:
+            for period, bucket in self.get_buckets(date_created):
+                sums[(group_id, period, bucket, user_id)] += delta
+
+        with self.lock:
+            unknown_keys = [key for key in sums if key not in self.known_keys]
+        if unknown_keys:
+            self.bulk_create(
+                [
+                    self.model(group_id=group_id, period=period, bucket=bucket, user_id=user_id)
+                    for group_id, period, bucket, user_id in unknown_keys
+                ],
+                ignore_conflicts=True
+            )
+            # Rows created by a transaction that's rolled back don't exist.
+            transaction.on_commit(lambda: self._add_known_keys(unknown_keys), using=self._db)
+
+        # Rows getting the same delta are updated together.
+        keys_by_delta = defaultdict(list)
+        for key, delta in sums.items():
+            if delta:
+                keys_by_delta[delta].append(key)
+        now = timezone.now()
+        for delta, keys in keys_by_delta.items():
+            query = Q()
+            for group_id, period, bucket, user_id in keys:
+                query |= Q(group_id=group_id, period=period, bucket=bucket, user_id=user_id)
+            self.get_queryset().filter(query).update(points=F('points') + delta, date_updated=now)
+
+    def _add_known_keys(self, keys) -> None:
+        with self.lock:
+            for key in keys:
+                self.known_keys[key] = True
+
+    def get_top_points(self, group_id, period, bucket, limit=10):
+        """Return the (user_id, points) of the members with the most points in a period."""
+        return self.get_queryset().filter(
+            group_id=group_id,
+            period=period,
+            bucket=bucket,
+            points__gt=0
+        ).order_by('-points').values_list('user_id', 'points')[:limit]
+
     def get_queryset(self):
-        return super(GroupMemberPointsManager, self).get_queryset()
\ No newline at end of file
+        return super(PointsRollupManager, self).get_queryset()
@@ -0,0 +1,34 @@
+# Generated by Django 4.0 on 2026-10-18 08:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='date updated')),
+                ('group_id', models.BigIntegerField()),
+                ('giver_id', models.PositiveBigIntegerField()),
+                ('receiver_id', models.PositiveBigIntegerField()),
+                ('delta', models.BigIntegerField()),
+                ('source_chat_id', models.BigIntegerField(null=True)),
+                ('source_message_id', models.BigIntegerField(null=True)),
+                ('compacted', models.BooleanField(db_index=True, default=False)),
+            ],
+            options={
+                'verbose_name': 'point transaction',
+                'verbose_name_plural': 'point transactions',
+                'unique_together': {('source_chat_id', 'source_message_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 08:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0002_pointtransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmemberpoints',
+            name='group_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_group_ids(apps, schema_editor):
+    """Copy the members' group ids to their points, in batches."""
+    GroupMemberPoints = apps.get_model('group_points', 'GroupMemberPoints')
+    TelegramGroupMember = apps.get_model('django_telegram', 'TelegramGroupMember')
+    group_id = Subquery(
+        TelegramGroupMember.objects.filter(
+            id=OuterRef('group_member_id')
+        ).values('group_id')[:1]
+    )
+    while True:
+        batch = list(
+            GroupMemberPoints.objects.filter(
+                group_id__isnull=True
+            ).values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        GroupMemberPoints.objects.filter(pk__in=batch).update(group_id=group_id)
+
+
+class Migration(migrations.Migration):
+    # Each batch is committed on its own, so large tables aren't locked
+    # by a single long transaction.
+    atomic = False
+
+    dependencies = [
+        ('group_points', '0003_groupmemberpoints_group_id'),
+        ('django_telegram', '0005_telegramgroupmember_display_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_group_ids, migrations.RunPython.noop),
+    ]
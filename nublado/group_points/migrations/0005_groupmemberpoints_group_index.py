@@ -0,0 +1,22 @@
+# Generated by Django 4.0 on 2026-10-18 08:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0004_backfill_groupmemberpoints_group_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='groupmemberpoints',
+            name='group_id',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='groupmemberpoints',
+            index=models.Index(fields=['group_id', '-points'], include=('group_member',), name='group_points_by_group_idx'),
+        ),
+    ]
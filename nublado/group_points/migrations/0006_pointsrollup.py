@@ -0,0 +1,39 @@
+# Generated by Django 4.0 on 2026-10-18 08:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0005_groupmemberpoints_group_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='date updated')),
+                ('group_id', models.BigIntegerField()),
+                ('user_id', models.PositiveBigIntegerField()),
+                ('period', models.CharField(max_length=10)),
+                ('bucket', models.CharField(max_length=10)),
+                ('points', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'points rollup',
+                'verbose_name_plural': 'points rollups',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pointsrollup',
+            index=models.Index(fields=['group_id', 'period', 'bucket', '-points'], name='group_points_rollup_top_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pointsrollup',
+            unique_together={('group_id', 'period', 'bucket', 'user_id')},
+        ),
+    ]
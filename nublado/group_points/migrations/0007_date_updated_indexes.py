@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0006_pointsrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupmemberpoints',
+            index=models.Index(fields=['date_updated'], name='group_points_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointsrollup',
+            index=models.Index(fields=['date_updated'], name='points_rollup_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointtransaction',
+            index=models.Index(fields=['date_updated'], name='point_transaction_updated_idx'),
+        ),
+    ]
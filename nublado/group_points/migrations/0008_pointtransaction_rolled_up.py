@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+def mark_rolled_up(apps, schema_editor):
+    """Compacted transactions were added to the rollups when they were compacted."""
+    PointTransaction = apps.get_model('group_points', 'PointTransaction')
+    PointTransaction.objects.filter(compacted=True).update(rolled_up=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0007_date_updated_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointtransaction',
+            name='rolled_up',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(mark_rolled_up, migrations.RunPython.noop),
+    ]
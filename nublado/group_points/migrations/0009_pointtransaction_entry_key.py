@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_points', '0008_pointtransaction_rolled_up'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointtransaction',
+            name='entry_key',
+            field=models.CharField(max_length=32, null=True, unique=True),
+        ),
+    ]
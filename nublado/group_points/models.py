@@ -5,7 +5,11 @@ from core.models import (
     TimestampModel
 )
 from django_telegram.models import TelegramGroupMember
-from .managers import GroupMemberPointsManager
+from .managers import (
+    GroupMemberPointsManager,
+    PointsRollupManager,
+    PointTransactionManager
+)
 
 
 class GroupMemberPoints(
@@ -16,6 +20,8 @@ class GroupMemberPoints(
         primary_key=True,
         on_delete=models.CASCADE
     )
+    # Copy of the member's group id, so group rankings don't need a join.
+    group_id = models.BigIntegerField()
     points = models.PositiveBigIntegerField(
         default=0
     )
@@ -27,9 +33,126 @@ class GroupMemberPoints(
 
     class Meta:
         verbose_name = _("group member points")
+        indexes = [
+            models.Index(
+                fields=['group_id', '-points'],
+                include=['group_member'],
+                name='group_points_by_group_idx'
+            ),
+            # For incremental snapshot exports.
+            models.Index(
+                fields=['date_updated'],
+                name='group_points_updated_idx'
+            )
+        ]
 
     def __str__(self):
         return "id: {0}, points: {1}".format(
             self.group_member_id,
             self.points
-        )
\ No newline at end of file
+        )
+
+
+class PointTransaction(TimestampModel):
+    """A change of a member's points, kept as an append-only ledger.
+
+    Transactions are rolled into the GroupMemberPoints totals when they're
+    recorded or, for batched writes, by the compaction job. Compacted
+    transactions are then added to the PointsRollup rows by a roll-up pass.
+    """
+    group_id = models.BigIntegerField()
+    giver_id = models.PositiveBigIntegerField()
+    receiver_id = models.PositiveBigIntegerField()
+    delta = models.BigIntegerField()
+    # The message that triggered the transaction. Each message counts once.
+    source_chat_id = models.BigIntegerField(
+        null=True
+    )
+    source_message_id = models.BigIntegerField(
+        null=True
+    )
+    compacted = models.BooleanField(
+        default=False,
+        db_index=True
+    )
+    # The key of a transfer buffered by the write-behind journal, so replaying
+    # the journal doesn't record it twice.
+    entry_key = models.CharField(
+        max_length=32,
+        null=True,
+        unique=True
+    )
+    rolled_up = models.BooleanField(
+        default=False,
+        db_index=True
+    )
+
+    objects = PointTransactionManager()
+
+    class Meta:
+        verbose_name = _("point transaction")
+        verbose_name_plural = _("point transactions")
+        unique_together = ('source_chat_id', 'source_message_id')
+        indexes = [
+            # For incremental snapshot exports.
+            models.Index(
+                fields=['date_updated'],
+                name='point_transaction_updated_idx'
+            )
+        ]
+
+    def __str__(self):
+        return "group: {0}, receiver: {1}, delta: {2}".format(
+            self.group_id,
+            self.receiver_id,
+            self.delta
+        )
+
+
+class PointsRollup(TimestampModel):
+    """The net points a member got in a period, e.g. a week or a language's days."""
+    PERIOD_DAY = "day"
+    PERIOD_WEEK = "week"
+    PERIOD_MONTH = "month"
+    PERIOD_LANGUAGE = "language"
+
+    group_id = models.BigIntegerField()
+    user_id = models.PositiveBigIntegerField()
+    period = models.CharField(
+        max_length=10
+    )
+    # The period's key, e.g. 2022-05-02 (day), 2022-W18 (week), 2022-05
+    # (month) or en (language).
+    bucket = models.CharField(
+        max_length=10
+    )
+    points = models.BigIntegerField(
+        default=0
+    )
+
+    objects = PointsRollupManager()
+
+    class Meta:
+        verbose_name = _("points rollup")
+        verbose_name_plural = _("points rollups")
+        unique_together = ('group_id', 'period', 'bucket', 'user_id')
+        indexes = [
+            models.Index(
+                fields=['group_id', 'period', 'bucket', '-points'],
+                name='group_points_rollup_top_idx'
+            ),
+            # For incremental snapshot exports.
+            models.Index(
+                fields=['date_updated'],
+                name='points_rollup_updated_idx'
+            )
+        ]
+
+    def __str__(self):
+        return "group: {0}, user: {1}, {2} {3}: {4}".format(
+            self.group_id,
+            self.user_id,
+            self.period,
+            self.bucket,
+            self.points
+        )
@@ -0,0 +1,227 @@
+import logging
+import random
+import threading
+import time
+
+from .models import GroupMemberPoints
+from .write_behind import get_pending_deltas
+
+logger = logging.getLogger('django')
+
+# Indexes are verified against the database after this many seconds, and
+# rebuilt if changes made by other processes left them out of date.
+RANK_INDEX_MAX_AGE = 300
+
+
+class _Node(object):
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next = [None] * level
+        # Number of positions each link skips.
+        self.width = [1] * level
+
+
+class IndexableSkipList(object):
+    """A sorted collection of unique keys with O(log n) insertion, removal and positional access."""
+    MAX_LEVEL = 24
+
+    def __init__(self):
+        self.head = _Node(None, self.MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        chain = [None] * self.MAX_LEVEL
+        steps_at_level = [0] * self.MAX_LEVEL
+        node = self.head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_node = _Node(key, self._random_level())
+        steps = 0
+        for level in range(len(new_node.next)):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(len(new_node.next), self.MAX_LEVEL):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key) -> None:
+        chain = [None] * self.MAX_LEVEL
+        node = self.head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key) -> int:
+        """Return the number of keys lower than a key."""
+        position = 0
+        node = self.head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def __getitem__(self, i: int):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        i += 1
+        node = self.head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+
+class GroupRankIndex(object):
+    """The members of a group ordered by points, for rank and neighbourhood queries.
+
+    Members are ordered by points, highest first, then by user id. Members
+    with equal points share a rank.
+    """
+    def __init__(self, group_id: int):
+        self.group_id = group_id
+        self.points = {}
+        self.entries = IndexableSkipList()
+        self.lock = threading.RLock()
+        self.built = None
+
+    def load(self) -> dict:
+        points = dict(
+            GroupMemberPoints.objects.filter(
+                group_id=self.group_id
+            ).values_list('group_member__user_id', 'points')
+        )
+        for user_id, delta in get_pending_deltas(self.group_id).items():
+            points[user_id] = max(points.get(user_id, 0) + delta, 0)
+        return points
+
+    def build(self) -> None:
+        points = self.load()
+        entries = IndexableSkipList()
+        for user_id, member_points in points.items():
+            entries.insert((-member_points, user_id))
+        with self.lock:
+            self.points = points
+            self.entries = entries
+            self.built = time.monotonic()
+
+    def verify(self) -> bool:
+        """Compare the index with the database and rebuild it if they differ."""
+        points = self.load()
+        with self.lock:
+            consistent = points == self.points and len(self.entries) == len(points)
+            if consistent:
+                self.built = time.monotonic()
+        if not consistent:
+            logger.warning(f"Rank index of group {self.group_id} was inconsistent. Rebuilding.")
+            self.build()
+        return consistent
+
+    def update(self, user_id: int, points: int) -> None:
+        with self.lock:
+            previous = self.points.get(user_id)
+            if previous == points:
+                return
+            if previous is not None:
+                self.entries.remove((-previous, user_id))
+            self.entries.insert((-points, user_id))
+            self.points[user_id] = points
+
+    def total(self) -> int:
+        return len(self.entries)
+
+    def rank(self, user_id: int):
+        """Return a member's rank (1 is first), or None if the member has no points row."""
+        with self.lock:
+            points = self.points.get(user_id)
+            if points is None:
+                return None
+            return self.entries.index((-points, float('-inf'))) + 1
+
+    def percentile(self, user_id: int):
+        """Return the percentage of members with fewer points than a member."""
+        with self.lock:
+            points = self.points.get(user_id)
+            if points is None:
+                return None
+            below = len(self.entries) - self.entries.index((-points, float('inf')))
+            return 100 * below / len(self.entries)
+
+    def neighbours(self, user_id: int, count: int = 1) -> list:
+        """Return the (rank, user_id, points) of a member and the members right above and below."""
+        with self.lock:
+            points = self.points.get(user_id)
+            if points is None:
+                return []
+            position = self.entries.index((-points, user_id))
+            neighbours = []
+            for i in range(max(position - count, 0), min(position + count + 1, len(self.entries))):
+                neighbour_points, neighbour_id = self.entries[i]
+                neighbour_rank = self.entries.index((neighbour_points, float('-inf'))) + 1
+                neighbours.append((neighbour_rank, neighbour_id, -neighbour_points))
+            return neighbours
+
+
+class RankIndexRegistry(object):
+    """Rank indexes of the groups, built lazily and verified against the database every `max_age` seconds."""
+    def __init__(self, max_age: float = RANK_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def get(self, group_id: int) -> GroupRankIndex:
+        with self.lock:
+            index = self.indexes.get(group_id)
+            if index is None:
+                index = self.indexes[group_id] = GroupRankIndex(group_id)
+        with index.lock:
+            if index.built is None:
+                index.build()
+            elif time.monotonic() - index.built > self.max_age:
+                index.verify()
+        return index
+
+    def update(self, group_id: int, user_id: int, points: int) -> None:
+        """Apply a member's new points to the group's index, if it was built."""
+        index = self.indexes.get(group_id)
+        if index is not None and index.built is not None:
+            index.update(user_id, points)
+
+    def invalidate(self, group_id: int) -> None:
+        with self.lock:
+            self.indexes.pop(group_id, None)
+
+
+rank_indexes = RankIndexRegistry()
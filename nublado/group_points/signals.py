@@ -0,0 +1,9 @@
+from django.dispatch import receiver
+
+from django_telegram.signals import members_added
+from .models import GroupMemberPoints
+
+
+@receiver(members_added)
+def create_group_members_points(sender, group_id=None, user_ids=None, **kwargs):
+    GroupMemberPoints.objects.bulk_create_missing(group_id, user_ids)
@@ -0,0 +1,299 @@
+import json
+import os
+import random
+import subprocess
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from telegram.error import BadRequest
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_telegram.outbound import OutboundBot, capture_reply, reply_eligible
+from language_days.functions import get_language_day_date
+
+from .announcements import PointsAnnouncer
+from .models import GroupMemberPoints, PointsRollup, PointTransaction
+from .rank_index import GroupRankIndex, IndexableSkipList, RankIndexRegistry
+from .write_behind import JOURNAL_PREFIX, PointsWriteBehindBuffer, write_entries
+
+GROUP_ID = -100
+
+
+def get_points(user_id: int) -> int:
+    return GroupMemberPoints.objects.get_totals(GROUP_ID, [user_id])[user_id][0]
+
+
+class TransferPointsTests(TestCase):
+    def test_add_and_remove(self):
+        transfer = GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2)
+        self.assertEqual((transfer.sender_points, transfer.receiver_points), (0, 1))
+        transfer = GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2, remove=True)
+        self.assertEqual(transfer.receiver_points, 0)
+        self.assertEqual(get_points(2), 0)
+
+    def test_removal_clamped_at_zero(self):
+        transfer = GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2, remove=True)
+        self.assertEqual(transfer.receiver_points, 0)
+        GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2)
+        self.assertEqual(get_points(2), 1)
+        # The ledger records the changes that were applied.
+        self.assertEqual(list(PointTransaction.objects.order_by('id').values_list('delta', flat=True)), [0, 1])
+
+    def test_duplicate_source(self):
+        GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2, source_chat_id=GROUP_ID, source_message_id=5)
+        transfer = GroupMemberPoints.objects.transfer_points(
+            GROUP_ID, 1, 2, source_chat_id=GROUP_ID, source_message_id=5
+        )
+        self.assertTrue(transfer.duplicate)
+        self.assertEqual(transfer.receiver_points, 1)
+        self.assertEqual(get_points(2), 1)
+
+
+class TransferPointsQueriesTests(TestCase):
+    def test_statements(self):
+        GroupMemberPoints.objects.get_totals(GROUP_ID, [1, 2])
+        with CaptureQueriesContext(connection) as context:
+            GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2)
+        statements = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if query['sql'].split()[0] in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+        ]
+        # The locking read, the update and the ledger row.
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'INSERT'])
+
+
+class RollUpTests(TestCase):
+    def test_roll_up(self):
+        GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2)
+        GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2)
+        self.assertFalse(PointsRollup.objects.exists())
+        self.assertEqual(PointTransaction.objects.roll_up_all(), 2)
+        self.assertEqual(
+            set(PointsRollup.objects.values_list('user_id', 'points')),
+            {(2, 2)}
+        )
+        self.assertEqual(PointTransaction.objects.roll_up_all(), 0)
+
+    def test_backfill_rollups(self):
+        for i in range(3):
+            GroupMemberPoints.objects.transfer_points(GROUP_ID, 1, 2)
+        PointTransaction.objects.roll_up_all()
+        call_command('backfill_rollups', stdout=StringIO())
+        call_command('backfill_rollups', stdout=StringIO())
+        self.assertEqual(set(PointsRollup.objects.values_list('user_id', 'points')), {(2, 3)})
+
+    @override_settings(TIME_ZONE='Asia/Tokyo')
+    def test_buckets_follow_language_day(self):
+        # 23:30 UTC on Sunday is Monday morning in Tokyo.
+        when = datetime(2026, 10, 18, 23, 30, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=when):
+            language_day_date = get_language_day_date()
+        buckets = dict(PointsRollup.objects.get_buckets(when))
+        self.assertEqual(buckets[PointsRollup.PERIOD_DAY], language_day_date.isoformat())
+        self.assertEqual(buckets[PointsRollup.PERIOD_DAY], '2026-10-19')
+
+
+class ApplyDeltasTests(TestCase):
+    def test_clamped_per_delta(self):
+        applied = GroupMemberPoints.objects.apply_deltas([
+            (GROUP_ID, 2, -1),
+            (GROUP_ID, 2, 1),
+            (GROUP_ID, 3, 2),
+            (GROUP_ID, 3, -5)
+        ])
+        self.assertEqual(applied, [0, 1, 2, -2])
+        self.assertEqual(get_points(2), 1)
+        self.assertEqual(get_points(3), 0)
+
+    def test_compaction_records_applied_deltas(self):
+        PointTransaction.objects.bulk_record([
+            PointTransaction(group_id=GROUP_ID, giver_id=1, receiver_id=2, delta=delta)
+            for delta in (-1, -1, 2, -1)
+        ])
+        self.assertEqual(PointTransaction.objects.compact(), 4)
+        self.assertEqual(get_points(2), 1)
+        self.assertEqual(
+            list(PointTransaction.objects.order_by('id').values_list('delta', flat=True)),
+            [0, 0, 2, -1]
+        )
+        PointTransaction.objects.roll_up_all()
+        self.assertEqual(set(PointsRollup.objects.values_list('points', flat=True)), {1})
+
+
+class IndexableSkipListTests(SimpleTestCase):
+    def test_matches_sorted_list(self):
+        rng = random.Random(1)
+        skip_list = IndexableSkipList()
+        keys = []
+        for i in range(500):
+            if keys and rng.random() < 0.3:
+                key = keys.pop(rng.randrange(len(keys)))
+                skip_list.remove(key)
+            else:
+                key = (rng.randrange(-50, 0), i)
+                keys.append(key)
+                skip_list.insert(key)
+            keys.sort()
+            self.assertEqual(len(skip_list), len(keys))
+        self.assertEqual([skip_list[i] for i in range(len(skip_list))], keys)
+        for position, key in enumerate(keys):
+            self.assertEqual(skip_list.index(key), position)
+
+    def test_remove_missing(self):
+        skip_list = IndexableSkipList()
+        skip_list.insert(1)
+        with self.assertRaises(KeyError):
+            skip_list.remove(2)
+        with self.assertRaises(IndexError):
+            skip_list[1]
+
+
+class GroupRankIndexTests(TestCase):
+    def setUp(self):
+        for user_id, points in ((1, 5), (2, 3), (3, 3), (4, 0)):
+            GroupMemberPoints.objects.apply_deltas([(GROUP_ID, user_id, points)])
+        self.index = GroupRankIndex(GROUP_ID)
+        self.index.build()
+
+    def test_rank(self):
+        self.assertEqual(self.index.rank(1), 1)
+        # Members with equal points share a rank.
+        self.assertEqual(self.index.rank(2), 2)
+        self.assertEqual(self.index.rank(3), 2)
+        self.assertEqual(self.index.rank(4), 4)
+        self.assertIsNone(self.index.rank(5))
+        self.assertEqual(self.index.percentile(1), 75)
+
+    def test_neighbours(self):
+        self.assertEqual(self.index.neighbours(2), [(1, 1, 5), (2, 2, 3), (2, 3, 3)])
+
+    def test_update(self):
+        self.index.update(4, 6)
+        self.assertEqual(self.index.rank(4), 1)
+        self.assertEqual(self.index.total(), 4)
+
+    def test_verify(self):
+        self.assertTrue(self.index.verify())
+        GroupMemberPoints.objects.apply_deltas([(GROUP_ID, 4, 10)])
+        self.assertFalse(self.index.verify())
+        self.assertEqual(self.index.rank(4), 1)
+
+    def test_registry_verifies_old_indexes(self):
+        registry = RankIndexRegistry(max_age=0)
+        registry.get(GROUP_ID)
+        GroupMemberPoints.objects.apply_deltas([(GROUP_ID, 4, 10)])
+        self.assertEqual(registry.get(GROUP_ID).rank(4), 1)
+
+
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        self.journal_dir = journal_dir.name
+        # Flushed by the tests only.
+        self.buffer = PointsWriteBehindBuffer(self.journal_dir, flush_interval=3600, flush_size=1000)
+        self.buffer.thread = True
+
+    def get_entry(self, receiver_id: int, delta: int, entry_key: str, source_message_id=None) -> list:
+        return [GROUP_ID, 1, receiver_id, delta, GROUP_ID, source_message_id, 1700000000.0, entry_key]
+
+    def test_pending_transfers(self):
+        transfer = self.buffer.transfer(GROUP_ID, 1, 2)
+        self.assertEqual(transfer.receiver_points, 1)
+        # Totals are cached, so buffered transfers don't query the database.
+        with self.assertNumQueries(0):
+            transfer = self.buffer.transfer(GROUP_ID, 1, 2)
+        self.assertEqual(transfer.receiver_points, 2)
+        self.assertEqual(get_points(2), 0)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(get_points(2), 2)
+        self.assertEqual(self.buffer.transfer(GROUP_ID, 1, 2).receiver_points, 3)
+
+    def test_duplicate_sources(self):
+        self.buffer.transfer(GROUP_ID, 1, 2, source_chat_id=GROUP_ID, source_message_id=5)
+        transfer = self.buffer.transfer(GROUP_ID, 1, 2, source_chat_id=GROUP_ID, source_message_id=5)
+        self.assertTrue(transfer.duplicate)
+        self.assertEqual(transfer.receiver_points, 1)
+        self.buffer.flush()
+        transfer = self.buffer.transfer(GROUP_ID, 1, 2, source_chat_id=GROUP_ID, source_message_id=5)
+        self.assertTrue(transfer.duplicate)
+        self.assertEqual(get_points(2), 1)
+
+    def test_replayed_entries_recorded_once(self):
+        entries = [self.get_entry(2, 1, "a"), self.get_entry(2, 1, "b")]
+        write_entries(entries)
+        write_entries(entries)
+        self.assertEqual(PointTransaction.objects.count(), 2)
+        self.assertEqual(get_points(2), 2)
+
+    def test_failed_flush_retried(self):
+        self.buffer.transfer(GROUP_ID, 1, 2)
+        with mock.patch.object(PointTransaction.objects, 'compact', side_effect=RuntimeError()):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        # The entries were recorded and compacted in one transaction.
+        self.assertFalse(PointTransaction.objects.exists())
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(get_points(2), 1)
+
+    def test_recover_journal(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        path = os.path.join(self.journal_dir, "{0}{1}.jsonl".format(JOURNAL_PREFIX, process.pid))
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.get_entry(2, 1, "a", source_message_id=7)) + "\n")
+            f.write(json.dumps(self.get_entry(3, 1, "b")) + "\n")
+            # A partially written last line.
+            f.write('[{0}, 1'.format(GROUP_ID))
+        self.assertEqual(self.buffer.recover(), 2)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual((get_points(2), get_points(3)), (1, 1))
+
+
+class PointsAnnouncerTests(SimpleTestCase):
+    def setUp(self):
+        self.bot = OutboundBot("123456:ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghi")
+        self.requests = []
+        self.deleted = set()
+
+        def post(endpoint, data=None, timeout=None, api_kwargs=None):
+            self.requests.append(endpoint)
+            if endpoint == 'editMessageText' and data['message_id'] in self.deleted:
+                raise BadRequest("Message to edit not found")
+            return {
+                'message_id': len(self.requests),
+                'date': 0,
+                'chat': {'id': data['chat_id'], 'type': 'group'},
+                'text': data['text']
+            }
+        patcher = mock.patch('telegram.bot.Bot._post', side_effect=post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def announce(self, announcer: PointsAnnouncer, text: str):
+        # As in the command handlers, whose first message can be the webhook reply.
+        with capture_reply() as capture, reply_eligible():
+            announcer.announce(self.bot, GROUP_ID, text)
+        return capture.reply
+
+    def test_edit_not_captured(self):
+        announcer = PointsAnnouncer()
+        self.announce(announcer, "a")
+        self.assertIsNone(self.announce(announcer, "b"))
+        self.assertEqual(self.requests, ['sendMessage', 'editMessageText'])
+        self.assertEqual(announcer.announcements[GROUP_ID].lines, ["a", "b"])
+
+    def test_deleted_announcement(self):
+        announcer = PointsAnnouncer()
+        self.announce(announcer, "a")
+        self.deleted.add(announcer.announcements[GROUP_ID].message_id)
+        self.announce(announcer, "b")
+        self.assertEqual(self.requests, ['sendMessage', 'editMessageText', 'sendMessage'])
+        self.assertEqual(announcer.announcements[GROUP_ID].lines, ["b"])
+        self.assertEqual(announcer.stats(), {'sent': 2, 'edited': 0})
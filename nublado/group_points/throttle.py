@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from cachetools import TTLCache
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from django.conf import settings
+
+logger = logging.getLogger('django')
+
+THROTTLE = getattr(settings, 'GROUP_POINTS', {}).get('throttle', {})
+
+
+class SlidingWindowCounter(object):
+    """Approximate the events in a sliding window from the counts of the current and previous fixed windows."""
+    __slots__ = ('window', 'start', 'current', 'previous')
+
+    def __init__(self, window: float):
+        self.window = window
+        self.start = 0
+        self.current = 0
+        self.previous = 0
+
+    def count(self, now: float) -> float:
+        self._roll(now)
+        weight = 1 - (now - self.start) / self.window
+        return self.previous * weight + self.current
+
+    def add(self, now: float) -> None:
+        self._roll(now)
+        self.current += 1
+
+    def _roll(self, now: float) -> None:
+        start = now - now % self.window
+        if start != self.start:
+            self.previous = self.current if start - self.start == self.window else 0
+            self.current = 0
+            self.start = start
+
+
+class PointsThrottle(object):
+    """Limit how often members give or take points, per sender and per sender and receiver.
+
+    Counters of inactive members expire, and at most `maxsize` are kept.
+    """
+    def __init__(self, limits: dict = None, group_limits: dict = None, maxsize: int = 10000):
+        self.limits = limits or {}
+        self.group_limits = group_limits or {}
+        self.lock = threading.Lock()
+        max_window = max(
+            [self.limits.get('sender_window', 60), self.limits.get('pair_window', 60)] +
+            [
+                limits.get(key, 0)
+                for limits in self.group_limits.values()
+                for key in ('sender_window', 'pair_window')
+            ]
+        )
+        # A counter is only needed for two windows after its last event.
+        self.counters = TTLCache(maxsize=maxsize, ttl=2 * max_window)
+        self.shed = Counter()
+
+    def get_limits(self, group_id: int) -> dict:
+        limits = dict(self.limits)
+        limits.update(self.group_limits.get(group_id, {}))
+        return limits
+
+    def _get_counter(self, key, window: float) -> SlidingWindowCounter:
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = SlidingWindowCounter(window)
+        # Setting the counter again renews its expiry.
+        self.counters[key] = counter
+        return counter
+
+    def allow(self, group_id: int, sender_id: int, receiver_id: int) -> bool:
+        """Count an attempt to give or take points and return whether it's allowed."""
+        limits = self.get_limits(group_id)
+        now = time.time()
+        checks = [
+            ('sender', (group_id, sender_id), limits.get('sender_limit', 10), limits.get('sender_window', 60)),
+            ('pair', (group_id, sender_id, receiver_id), limits.get('pair_limit', 3), limits.get('pair_window', 60))
+        ]
+        with self.lock:
+            counters = []
+            for reason, key, limit, window in checks:
+                counter = self._get_counter(key, window)
+                if counter.count(now) >= limit:
+                    self.shed[reason] += 1
+                    return False
+                counters.append(counter)
+            for counter in counters:
+                counter.add(now)
+            self.shed['allowed'] += 1
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.shed)
+
+
+points_throttle = PointsThrottle(
+    limits=THROTTLE.get('default'),
+    group_limits=THROTTLE.get('groups'),
+    maxsize=THROTTLE.get('maxsize', 10000)
+)
+
+
+def throttle_points(group_id: int):
+    """Drop point replies over the throttle limits before any other work is done."""
+    def decorator(func):
+        @wraps(func)
+        def command_func(update: Update, context: CallbackContext, *args, **kwargs):
+            message = update.effective_message
+            if THROTTLE.get('enabled', True) and message and message.reply_to_message:
+                sender = update.effective_user
+                receiver = message.reply_to_message.from_user
+                if sender and receiver and not points_throttle.allow(group_id, sender.id, receiver.id):
+                    logger.info(f"Throttled points from {sender.id} to {receiver.id}. {points_throttle.stats()}")
+                    return
+            return func(update, context, *args, **kwargs)
+        return command_func
+
+    return decorator
@@ -0,0 +1,315 @@
+import atexit
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from cachetools import TTLCache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .leaderboard import invalidate_leaderboard
+from .managers import PointsTransfer
+from .models import GroupMemberPoints, PointTransaction
+
+logger = logging.getLogger('django')
+
+WRITE_BEHIND = getattr(settings, 'GROUP_POINTS', {}).get('write_behind', {})
+JOURNAL_PREFIX = "points-"
+
+
+class PointsWriteBehindBuffer(object):
+    """Buffer point transfers in memory and write them to the database in bulk.
+
+    Transfers are appended to a journal file before they're acknowledged and
+    flushed every `flush_interval` seconds or `flush_size` transfers, as
+    ledger rows compacted into the totals with a single bulk update. Reads
+    add the pending deltas to the totals in the database, which transfers
+    cache for `totals_ttl` seconds, so a transfer doesn't query the database.
+
+    Transfers from source messages that are pending or were flushed by this
+    process are returned as duplicates. Each entry has a key the ledger
+    records it with once, so journals left behind by a crash are safely
+    replayed when the buffer starts.
+    """
+    def __init__(
+        self,
+        journal_dir: str,
+        flush_interval: float = 10,
+        flush_size: int = 50,
+        totals_ttl: float = 60
+    ):
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.pending = []
+        self.pending_deltas = {}
+        self.pending_sources = set()
+        self.recorded_sources = TTLCache(maxsize=10000, ttl=3600)
+        self.totals = TTLCache(maxsize=10000, ttl=totals_ttl)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.journal = None
+        self.journal_count = 0
+        os.makedirs(journal_dir, exist_ok=True)
+
+    def get_journal_path(self, suffix: str = "") -> str:
+        return os.path.join(
+            self.journal_dir,
+            f"{JOURNAL_PREFIX}{os.getpid()}{suffix}.jsonl"
+        )
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._work,
+                name="points_write_behind",
+                daemon=True
+            )
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def transfer(
+        self,
+        group_id,
+        sender_id,
+        receiver_id,
+        remove=False,
+        source_chat_id=None,
+        source_message_id=None
+    ) -> PointsTransfer:
+        """Buffer a transfer and return the totals including the pending deltas."""
+        source = (source_chat_id, source_message_id) if source_message_id is not None else None
+        totals = self.get_totals(group_id, [sender_id, receiver_id])
+        point_increment = totals[sender_id][1]
+        entry = [
+            group_id,
+            sender_id,
+            receiver_id,
+            -point_increment if remove else point_increment,
+            source_chat_id,
+            source_message_id,
+            time.time(),
+            uuid.uuid4().hex
+        ]
+        with self.lock:
+            # Sources recorded by other processes are ignored by the ledger.
+            duplicate = source is not None and (
+                source in self.pending_sources or source in self.recorded_sources
+            )
+            if not duplicate:
+                self.start()
+                self._write_journal([entry])
+                self.pending.append(entry)
+                if source is not None:
+                    self.pending_sources.add(source)
+                key = (group_id, receiver_id)
+                self.pending_deltas[key] = self.pending_deltas.get(key, 0) + entry[3]
+                if len(self.pending) >= self.flush_size:
+                    self.wake.set()
+            sender_points = totals[sender_id][0] + self.pending_deltas.get((group_id, sender_id), 0)
+            receiver_points = totals[receiver_id][0] + self.pending_deltas.get((group_id, receiver_id), 0)
+
+        return PointsTransfer(
+            sender_points=max(sender_points, 0),
+            receiver_points=max(receiver_points, 0),
+            point_increment=point_increment,
+            duplicate=duplicate
+        )
+
+    def get_totals(self, group_id: int, user_ids: list) -> dict:
+        """Return the (points, point_increment) of members in the database, cached."""
+        with self.lock:
+            totals = dict(
+                (user_id, self.totals[(group_id, user_id)])
+                for user_id in user_ids
+                if (group_id, user_id) in self.totals
+            )
+        missing = [user_id for user_id in user_ids if user_id not in totals]
+        if missing:
+            loaded = GroupMemberPoints.objects.get_totals(group_id, missing)
+            with self.lock:
+                for user_id, member_totals in loaded.items():
+                    self.totals[(group_id, user_id)] = member_totals
+            totals.update(loaded)
+        return totals
+
+    def get_pending_delta(self, group_id: int, user_id: int) -> int:
+        with self.lock:
+            return self.pending_deltas.get((group_id, user_id), 0)
+
+    def get_pending_deltas(self, group_id: int) -> dict:
+        """Return the pending deltas of a group's members by user id."""
+        with self.lock:
+            return dict(
+                (user_id, delta)
+                for (delta_group_id, user_id), delta in self.pending_deltas.items()
+                if delta_group_id == group_id
+            )
+
+    def _write_journal(self, entries: list) -> None:
+        if self.journal is None:
+            self.journal = open(self.get_journal_path(), 'a')
+        for entry in entries:
+            self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def flush(self) -> int:
+        """Write the pending transfers to the database. Return how many were written."""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                entries = self.pending
+                self.pending = []
+                # New transfers go to a new journal while these are written.
+                self.journal.close()
+                self.journal = None
+                self.journal_count += 1
+                flushing_path = self.get_journal_path(f"-{self.journal_count}")
+                os.rename(self.get_journal_path(), flushing_path)
+
+            try:
+                write_entries(entries)
+            except Exception:
+                # Put the transfers back to be retried with the next flush.
+                with self.lock:
+                    self._write_journal(entries)
+                    self.pending = entries + self.pending
+                os.remove(flushing_path)
+                raise
+            os.remove(flushing_path)
+            with self.lock:
+                for group_id, giver_id, receiver_id, delta, source_chat_id, source_message_id, *values in entries:
+                    key = (group_id, receiver_id)
+                    self.pending_deltas[key] = self.pending_deltas.get(key, 0) - delta
+                    if not self.pending_deltas[key]:
+                        del self.pending_deltas[key]
+                    # The totals in the database now include the delta.
+                    self.totals.pop(key, None)
+                    if source_message_id is not None:
+                        source = (source_chat_id, source_message_id)
+                        self.pending_sources.discard(source)
+                        self.recorded_sources[source] = True
+            for group_id in set(entry[0] for entry in entries):
+                invalidate_leaderboard(group_id)
+            return len(entries)
+
+    def recover(self) -> int:
+        """Replay the journals left behind by processes that are no longer running."""
+        recovered = 0
+        for path in glob.glob(os.path.join(self.journal_dir, f"{JOURNAL_PREFIX}*.jsonl")):
+            pid = int(os.path.basename(path)[len(JOURNAL_PREFIX):].split('.')[0].split('-')[0])
+            if pid == os.getpid() or is_running(pid):
+                continue
+            with open(path) as f:
+                # A crash may have left a partially written last line.
+                entries = []
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        pass
+            write_entries(entries)
+            os.remove(path)
+            recovered += len(entries)
+        if recovered:
+            logger.warning(f"Recovered {recovered} unflushed point transfers.")
+        return recovered
+
+    def _work(self) -> None:
+        try:
+            self.recover()
+        except Exception as e:
+            logger.error(f"Error recovering point transfers: {e}")
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing point transfers: {e}")
+            finally:
+                close_old_connections()
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_entries(entries: list) -> None:
+    """Record journal entries in the ledger and compact them into the totals.
+
+    Entries already recorded are ignored by their keys, and the entries are
+    recorded and compacted in one transaction, so a failed write can be
+    retried and a journal can be replayed.
+    """
+    with transaction.atomic():
+        PointTransaction.objects.bulk_record([
+            PointTransaction(
+                group_id=group_id,
+                giver_id=giver_id,
+                receiver_id=receiver_id,
+                delta=delta,
+                source_chat_id=source_chat_id,
+                source_message_id=source_message_id,
+                date_created=datetime.datetime.fromtimestamp(timestamp, tz=timezone.utc),
+                entry_key=entry_key
+            )
+            for group_id, giver_id, receiver_id, delta, source_chat_id, source_message_id, timestamp, entry_key
+            in entries
+        ])
+        while PointTransaction.objects.compact():
+            pass
+    PointTransaction.objects.roll_up_all()
+
+
+def get_points_buffer():
+    """Return the write-behind buffer for point transfers, or None if disabled."""
+    if not WRITE_BEHIND.get('enabled', False):
+        return None
+    return PointsWriteBehindBuffer(
+        WRITE_BEHIND.get('journal_dir', '/tmp/nublado-points'),
+        flush_interval=WRITE_BEHIND.get('flush_interval', 10),
+        flush_size=WRITE_BEHIND.get('flush_size', 50),
+        totals_ttl=WRITE_BEHIND.get('totals_ttl', 60)
+    )
+
+
+points_buffer = get_points_buffer()
+
+
+def get_pending_delta(group_id: int, user_id: int) -> int:
+    """Return a member's buffered points delta, or 0 if the buffer is disabled."""
+    if points_buffer is None:
+        return 0
+    return points_buffer.get_pending_delta(group_id, user_id)
+
+
+def get_pending_deltas(group_id: int) -> dict:
+    """Return the buffered points deltas of a group's members by user id."""
+    if points_buffer is None:
+        return {}
+    return points_buffer.get_pending_deltas(group_id)
+
+
+def transfer_points(group_id, sender_id, receiver_id, **kwargs) -> PointsTransfer:
+    """Transfer points through the write-behind buffer if enabled, or right away."""
+    if points_buffer is not None:
+        return points_buffer.transfer(group_id, sender_id, receiver_id, **kwargs)
+    return GroupMemberPoints.objects.transfer_points(group_id, sender_id, receiver_id, **kwargs)
@@ -1,3 +1,5 @@
+from cachetools import TTLCache, cached
+
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import activate, gettext as _
@@ -15,9 +17,14 @@ def set_language_day_locale():
         activate(settings.LANGUAGE_CODE)
 
 
+def get_language_day_date(when=None):
+    """Return the local date of a time (default now), the clock language days and rollups follow."""
+    return timezone.localdate(when)
+
+
 def get_language_day() -> str:
     """Get the language day key based on an integer weekday value (Monday = 0)."""
-    weekday = timezone.now().weekday()
+    weekday = get_language_day_date().weekday()
 
     if 0 <= weekday <= 6:
         try:
@@ -50,4 +57,10 @@ def get_language_day_schedule() -> str:
                 weekday=weekday_abbr
             )
 
-    return schedule
\ No newline at end of file
+    return schedule
+
+
+@cached(TTLCache(maxsize=1, ttl=300))
+def get_weekday_languages() -> dict:
+    """Get the language day keys by weekday, cached for a few minutes."""
+    return dict(LanguageDay.objects.values_list('id', 'language'))
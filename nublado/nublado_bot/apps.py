@@ -14,6 +14,10 @@ class NubladoBotConfig(AppConfig):
     bot_key = settings.NUBLADO_BOT_TOKEN
 
     def ready(self):
+        from django_telegram.functions.group import (
+            member_status_handler,
+            chat_member_status_handler
+        )
         from .bot_commands.group_notes import (
             group_notes,
             save_group_note,
@@ -23,6 +27,7 @@ class NubladoBotConfig(AppConfig):
         from .bot_commands.group_admin import(
             update_group_admins,
             get_non_members,
+            sweep_members,
             member_join_handler,
             member_exit_handler,
             welcome_button_handler
@@ -36,16 +41,21 @@ class NubladoBotConfig(AppConfig):
             initiate_language_day
         )
         from .bot_commands.group_points import (
-            add_points_handler, remove_points_handler
+            add_points_handler, remove_points_handler,
+            group_top_points, member_rank
         )
 
         bot_registry = DjangoTelegramConfig.bot_registry
         bot = Bot(settings.NUBLADO_BOT_TOKEN)
 
         # Register handlers
+        # Keep cached member statuses up to date.
+        bot.add_handler(member_status_handler, handler_group=-1)
+        bot.add_handler(chat_member_status_handler, handler_group=-1)
         # group_admin
         bot.add_command_handler('update_group_admins', update_group_admins)
         bot.add_command_handler('get_non_members', get_non_members)
+        bot.add_command_handler('sweep_members', sweep_members)
         bot.add_handler(member_join_handler, handler_group=2)
         bot.add_handler(member_exit_handler, handler_group=2)
         bot.add_handler(welcome_button_handler, handler_group=2)
@@ -69,6 +79,8 @@ class NubladoBotConfig(AppConfig):
         # group_points
         bot.add_handler(add_points_handler, handler_group=2)
         bot.add_handler(remove_points_handler, handler_group=2)
+        bot.add_command_handler('top', group_top_points)
+        bot.add_command_handler('rank', member_rank)
         # notes
         bot.add_command_handler('group_notes', group_notes)
         bot.add_command_handler('save_group_note', save_group_note)
@@ -1,5 +1,7 @@
 import datetime as dt
 import logging
+import math
+import threading
 
 from telegram import (
     Bot, Update, ChatPermissions,
@@ -10,8 +12,10 @@ from telegram.ext import (
     CallbackContext, CallbackQueryHandler, MessageHandler, Filters
 )
 from telegram.constants import CHATMEMBER_CREATOR
+from telegram.utils.helpers import escape_markdown
 
 from django.conf import settings
+from django.db import close_old_connections
 from django.utils.translation import gettext as _
 
 from django_telegram.models import TelegramGroupMember
@@ -20,18 +24,24 @@ from django_telegram.functions.chat_actions import (
 )
 from django_telegram.functions.user import get_username_or_name
 from django_telegram.functions.group import (
-    restricted_group_member
+    restricted_group_member,
+    member_status_cache
 )
 from django_telegram.functions.admin import (
     update_group_members_from_admins,
     get_non_group_members
 )
-from django_telegram.models import TelegramGroupMember
+from django_telegram.models import (
+    MembershipCheck,
+    MembershipSweep,
+    TelegramGroupMember
+)
 from language_days.functions import set_language_day_locale
 
 logger = logging.getLogger('django')
 
 GROUP_ID = settings.NUBLADO_GROUP_ID
+NON_MEMBERS_PAGE_SIZE = 20
 
 # Callback data
 AGREE_BTN_CALLBACK_DATA = "chat_member_welcome_agree"
@@ -51,6 +61,62 @@ msg_welcome_agreed = _(
     "This helps us filter out fake accounts, trolls, etc.\n\n" \
     "We look forward to hearing from you."
 )
+msg_sweep_started = _("Membership sweep started. I'll let you know when it's done.")
+msg_sweep_running = _("A membership sweep of the group is already running.")
+msg_sweep_completed = _(
+    "Membership sweep completed.\n\n" \
+    "Checked: {checked}\n" \
+    "Left: {left}\n" \
+    "Errors: {errors}"
+)
+msg_no_sweep = _("No membership sweep has been completed. Start one with /sweep\\_members.")
+msg_non_members = _(
+    "*Members that left* ({page}/{num_pages})\n" \
+    "Sweep of {date}. Left: {left}, errors: {errors}\n\n" \
+    "{non_members}"
+)
+
+
+def run_membership_sweep(bot: Bot, chat_id: int, incremental: bool) -> None:
+    try:
+        sweep = get_non_group_members(bot, GROUP_ID, incremental=incremental)
+        if sweep is None:
+            message = _(msg_sweep_running)
+        else:
+            message = _(msg_sweep_completed).format(
+                checked=sweep.checked,
+                left=sweep.left,
+                errors=sweep.errors
+            )
+        bot.send_message(
+            chat_id=chat_id,
+            text=message
+        )
+    except Exception as e:
+        logger.error(f"Error sweeping group members: {e}")
+    finally:
+        close_old_connections()
+
+
+@send_typing_action
+@restricted_group_member(
+    group_id=GROUP_ID,
+    member_status=CHATMEMBER_CREATOR,
+    group_chat=False
+)
+def sweep_members(update: Update, context: CallbackContext) -> None:
+    """Start a membership sweep of the group in the background."""
+    incremental = bool(context.args) and context.args[0] == "incremental"
+    threading.Thread(
+        target=run_membership_sweep,
+        args=(context.bot, update.effective_chat.id, incremental),
+        name="membership_sweep",
+        daemon=True
+    ).start()
+    context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=_(msg_sweep_started)
+    )
 
 
 @send_typing_action
@@ -60,7 +126,44 @@ msg_welcome_agreed = _(
     group_chat=False
 )
 def get_non_members(update: Update, context: CallbackContext) -> None:
-    get_non_group_members(context.bot, GROUP_ID)
+    """Show a page of the members that left the group in the last membership sweep."""
+    page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    sweep = MembershipSweep.objects.get_latest(GROUP_ID)
+    if sweep is None:
+        message = _(msg_no_sweep)
+    else:
+        checks = MembershipCheck.objects.get_page(
+            sweep.id,
+            MembershipCheck.RESULT_LEFT,
+            page,
+            NON_MEMBERS_PAGE_SIZE
+        )
+        display_names = dict(
+            TelegramGroupMember.objects.filter(
+                group_id=GROUP_ID,
+                user_id__in=[check.user_id for check in checks]
+            ).values_list('user_id', 'display_name')
+        )
+        non_members = [
+            "{user_id} {name}".format(
+                user_id=check.user_id,
+                name=escape_markdown(display_names.get(check.user_id) or "")
+            )
+            for check in checks
+        ]
+        message = _(msg_non_members).format(
+            page=page,
+            num_pages=max(math.ceil(sweep.left / NON_MEMBERS_PAGE_SIZE), 1),
+            date=sweep.date_completed.strftime("%Y-%m-%d %H:%M"),
+            left=sweep.left,
+            errors=sweep.errors,
+            non_members="\n".join(non_members)
+        )
+
+    context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=message
+    )
 
 
 @send_typing_action
@@ -70,9 +173,12 @@ def get_non_members(update: Update, context: CallbackContext) -> None:
     group_chat=False
 )
 def update_group_admins(update: Update, context: CallbackContext) -> None:
-    members = update_group_members_from_admins(context.bot, GROUP_ID)
-    if members:
-        message = _("Group members updated from admins.")
+    members_added = update_group_members_from_admins(context.bot, GROUP_ID)
+    if members_added:
+        message = _("Group members updated from admins. Added: {inserted}, existing: {existing}").format(
+            inserted=members_added.inserted,
+            existing=members_added.existing
+        )
     else:
         message = _("Group members not updated from admins.")
 
@@ -83,22 +189,11 @@ def update_group_admins(update: Update, context: CallbackContext) -> None:
 
 
 def add_member(user_id, group_id):
-    member_exists = TelegramGroupMember.objects.filter(
-        group_id=group_id,
-        user_id=user_id
-    ).exists()
-    if not member_exists:
-        TelegramGroupMember.objects.create_group_member(
-            group_id=group_id,
-            user_id=user_id
-        )
+    TelegramGroupMember.objects.add_members(group_id, [user_id])
 
 
 def remove_member(user_id, group_id):
-    TelegramGroupMember.objects.filter(
-        group_id=group_id,
-        user_id=user_id
-    ).delete()
+    TelegramGroupMember.objects.remove_members(group_id, [user_id])
 
 
 def restrict_chat_member(bot: Bot, user_id: int, chat_id: int):
@@ -208,6 +303,7 @@ def chat_member_welcome_agree(
     bot: Bot, user_id: int, chat_id: int, welcome_message_id: int = None
 ) -> None:
     unrestrict_chat_member(bot, user_id, chat_id)
+    member_status_cache.invalidate(chat_id, user_id)
     if welcome_message_id:
         try:
             bot.delete_message(
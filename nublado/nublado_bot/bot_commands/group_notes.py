@@ -10,6 +10,7 @@ from django.conf import settings
 from django.utils.translation import gettext as _
 
 from django_telegram.functions.chat_actions import send_typing_action
+from django_telegram.functions.functions import reply_in_response
 from django_telegram.functions.group import (
     restricted_group_member
 )
@@ -31,6 +32,7 @@ GET_GROUP_NOTE_REGEX = '^[' + TAG_CHAR + '][a-zA-Z0-9_-]+$'
 
 @restricted_group_member(group_id=GROUP_ID)
 @send_typing_action
+@reply_in_response
 def group_notes(update: Update, context: CallbackContext) -> None:
     cmd_group_notes(update, context, group_id=GROUP_ID)
 
@@ -43,12 +45,14 @@ def save_group_note(update: Update, context: CallbackContext) -> None:
 
 @restricted_group_member(group_id=GROUP_ID, member_status=CHATMEMBER_CREATOR)
 @send_typing_action
+@reply_in_response
 def remove_group_note(update: Update, context: CallbackContext) -> None:
     cmd_remove_group_note(update, context, group_id=GROUP_ID)
 
 
 @restricted_group_member(group_id=GROUP_ID)
 @send_typing_action
+@reply_in_response
 def get_group_note(update: Update, context: CallbackContext) -> None:
     cmd_get_group_note(
         update,
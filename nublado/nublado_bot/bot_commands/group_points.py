@@ -11,13 +11,17 @@ from django.utils.translation import gettext as _
 from django_telegram.functions.chat_actions import (
     send_typing_action
 )
+from django_telegram.functions.functions import reply_in_response
 from django_telegram.functions.group import (
     restricted_group_member
 )
 from group_points.bot_commands import (
     add_points as cmd_add_points,
-    remove_points as cmd_remove_points
+    remove_points as cmd_remove_points,
+    group_top_points as cmd_group_top_points,
+    member_rank as cmd_member_rank
 )
+from group_points.throttle import throttle_points
 
 logger = logging.getLogger('django')
 
@@ -28,18 +32,36 @@ REMOVE_POINTS_REGEX = '^[' + REMOVE_POINTS_CHAR + '][\s\S]*$'
 GROUP_ID = settings.NUBLADO_GROUP_ID
 
 # Command handlers 
+@throttle_points(GROUP_ID)
 @restricted_group_member(group_id=GROUP_ID, private_chat=False)
 @send_typing_action
+@reply_in_response
 def add_points(update: Update, context: CallbackContext) -> None:
     cmd_add_points(update, context, GROUP_ID)
 
 
+@throttle_points(GROUP_ID)
 @restricted_group_member(group_id=GROUP_ID, private_chat=False)
 @send_typing_action
+@reply_in_response
 def remove_points(update: Update, context: CallbackContext) -> None:
     cmd_remove_points(update, context, GROUP_ID)
 
 
+@restricted_group_member(group_id=GROUP_ID, private_chat=False)
+@send_typing_action
+@reply_in_response
+def group_top_points(update: Update, context: CallbackContext) -> None:
+    cmd_group_top_points(update, context, GROUP_ID)
+
+
+@restricted_group_member(group_id=GROUP_ID, private_chat=False)
+@send_typing_action
+@reply_in_response
+def member_rank(update: Update, context: CallbackContext) -> None:
+    cmd_member_rank(update, context, GROUP_ID)
+
+
 # Message handlers to listen for triggers to add or remove points.
 add_points_handler = MessageHandler(
     (Filters.regex(ADD_POINTS_REGEX) & Filters.reply),
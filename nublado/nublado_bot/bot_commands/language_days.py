@@ -11,11 +11,13 @@ from django.utils.translation import gettext as _
 from django_telegram.functions.chat_actions import (
     send_typing_action
 )
+from django_telegram.functions.functions import reply_in_response
 from django_telegram.functions.group import (
     restricted_group_member
 )
+from django_telegram.functions.messages import delete_tmp_messages
 from language_days.functions import (
-    get_language_day, set_language_day_locale,
+    get_language_day, get_language_day_date, set_language_day_locale,
     get_language_day_schedule
 )
 from django_telegram.models import TmpMessage
@@ -28,24 +30,12 @@ GROUP_ID = settings.NUBLADO_GROUP_ID
 
 def clear_tmp_messages(bot: Bot) -> None:
     """Get previously saved tmp messages and delete them."""
-    group_tmp_messages = TmpMessage.objects.filter(chat_id=GROUP_ID)
-
-    if group_tmp_messages:
-        for tmp_message in group_tmp_messages:
-            try:
-                bot.delete_message(
-                    chat_id=tmp_message.chat_id,
-                    message_id=tmp_message.message_id
-                )
-                logger.info("Message deleted")
-            except:
-                logger.error("Message to delete not found.")
-
-            tmp_message.delete()
+    delete_tmp_messages(bot, chat_id=GROUP_ID)
 
 
 @restricted_group_member(group_id=GROUP_ID)
 @send_typing_action
+@reply_in_response
 def schedule(update: Update, context: CallbackContext) -> None:
     """Display the group schedule."""
     message = get_language_day_schedule()
@@ -57,14 +47,15 @@ def schedule(update: Update, context: CallbackContext) -> None:
 
 @restricted_group_member(group_id=GROUP_ID)
 @send_typing_action
+@reply_in_response
 def language_day(update: Update, context: CallbackContext) -> None:
     """Display the current language day."""
     set_language_day_locale()
     language_day = get_language_day()
-    weekday = timezone.now().weekday()
+    weekday = get_language_day_date().weekday()
     message = _("It's {weekday}, {time} {timezone}.\nIt's {language_day} day.").format(
         weekday=_(settings.WEEKDAYS[weekday]),
-        time=timezone.now().strftime('%H:%M'),
+        time=timezone.localtime().strftime('%H:%M'),
         timezone=settings.TIME_ZONE,
         language_day=_(settings.LANGUAGE_DAYS[language_day])
     )
@@ -13,7 +13,10 @@ from django_telegram.functions.group import (
     restricted_group_member,
     get_random_group_member
 )
-from django_telegram.functions.functions import parse_command_last_arg_text
+from django_telegram.functions.functions import (
+    parse_command_last_arg_text,
+    reply_in_response
+)
 
 logger = logging.getLogger('django')
 
@@ -23,6 +26,7 @@ GROUP_ID = settings.NUBLADO_GROUP_ID
 
 @restricted_group_member(group_id=GROUP_ID, group_chat=False)
 @send_typing_action
+@reply_in_response
 def start(update: Update, context: CallbackContext) -> None:
     """Send a message and prompt a reply on start."""
     user = update.effective_user
@@ -39,6 +43,7 @@ def start(update: Update, context: CallbackContext) -> None:
 
 @restricted_group_member(group_id=GROUP_ID, private_chat=False)
 @send_typing_action
+@reply_in_response
 def hello(update: Update, context: CallbackContext) -> None:
     member = get_random_group_member(GROUP_ID)
     if member:
@@ -59,6 +64,7 @@ def hello(update: Update, context: CallbackContext) -> None:
 
 @restricted_group_member(group_id=GROUP_ID, member_status=CHATMEMBER_CREATOR)
 @send_typing_action
+@reply_in_response
 def echo(update: Update, context: CallbackContext) -> None:
     """Echo a message to the group."""
     if len(context.args) >= 1:
@@ -74,6 +80,7 @@ def echo(update: Update, context: CallbackContext) -> None:
 
 @restricted_group_member(group_id=GROUP_ID, private_chat=False)
 @send_typing_action
+@reply_in_response
 def reverse_text(update: Update, context: CallbackContext) -> None:
     """Reverse the text provided as an argument and display it."""
     if len(context.args) >= 1: